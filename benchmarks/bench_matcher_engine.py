@@ -0,0 +1,103 @@
+"""
+Compares the row-by-row and vectorized BoiteS3Matcher engines.
+
+Times only the matching step on an in-memory Boite, so Excel parsing and
+S3 listing do not hide the difference.
+
+    python -m benchmarks.bench_matcher_engine --rows 10000 --rows 50000
+"""
+
+import json
+import time
+
+import click
+import pandas as pd
+
+from refactory.file_import.boite_matcher import BoiteS3Matcher
+from refactory.storage_connection import StorageProvider
+
+
+class PresignOnlyProvider(StorageProvider):
+    """Provider stub that only produces deterministic URLs."""
+
+    def list_folders(self, base_path: str) -> list[str]:
+        return []
+
+    def list_files(self, folder_path: str, extension: str = None) -> list[str]:
+        return []
+
+    def download_to_temp(self, file_path: str, temp_file_path: str) -> None:
+        raise NotImplementedError
+
+    def upload_file(self, local_file_path: str, remote_file_path: str) -> None:
+        raise NotImplementedError
+
+    def generate_presigned_url(
+        self, file_key: str, file_type: str = None, content_type: str = None
+    ) -> str:
+        return f"https://s3.example/{file_key}"
+
+
+def make_boite(rows: int) -> tuple[pd.DataFrame, dict[str, list[str]]]:
+    """Synthetic Boite where ~10% of PDFs and ~20% of PDF_LATEX files are missing."""
+    names = [f"LEP-RF-{i:06d}-ps" for i in range(rows)]
+    df = pd.DataFrame({0: range(100000, 100000 + rows), 1: names})
+    keys_by_type = {
+        "PDF": [
+            f"cern-archives/raw/PDF/BOITE_O0125/{name}/{name}.pdf"
+            for i, name in enumerate(names)
+            if i % 10
+        ],
+        "PDF_LATEX": [
+            f"cern-archives/raw/PDF_LATEX/BOITE_O0125/{name.upper()}_latex.pdf"
+            for i, name in enumerate(names)
+            if i % 5
+        ],
+    }
+    return df, keys_by_type
+
+
+def make_matcher(engine: str) -> BoiteS3Matcher:
+    matcher = BoiteS3Matcher.__new__(BoiteS3Matcher)
+    matcher.provider = PresignOnlyProvider()
+    matcher.file_types = ["PDF", "PDF_LATEX"]
+    matcher.near_match_distance = 0
+    matcher.engine = engine
+    return matcher
+
+
+def run(rows: int) -> dict:
+    df, keys_by_type = make_boite(rows)
+
+    timings, results = {}, {}
+    for engine, method in (
+        ("python", "_match_records"),
+        ("vectorized", "_match_records_vectorized"),
+    ):
+        matcher = make_matcher(engine)
+        start = time.perf_counter()
+        results[engine] = getattr(matcher, method)(df, keys_by_type)
+        timings[engine] = time.perf_counter() - start
+
+    return {
+        "benchmark": "matcher_engine",
+        "rows": rows,
+        "python_seconds": round(timings["python"], 4),
+        "vectorized_seconds": round(timings["vectorized"], 4),
+        "speedup": round(timings["python"] / timings["vectorized"], 1),
+        "identical": results["python"] == results["vectorized"],
+    }
+
+
+@click.command()
+@click.option(
+    "--rows", multiple=True, type=int, default=(10000, 50000), show_default=True
+)
+def main(rows):
+    """Times both matching engines on synthetic Boites of the given sizes."""
+    for count in rows:
+        click.echo(json.dumps(run(count)))
+
+
+if __name__ == "__main__":
+    main()
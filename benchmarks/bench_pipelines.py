@@ -0,0 +1,210 @@
+"""
+Times the end-to-end pipelines on synthetic datasets, fully offline.
+
+Storage is an in-memory stand-in (`benchmarks.synthetic`) with S3 prefix
+semantics and real presigning, so the timings cover the pipelines' own work:
+Excel parsing, listing, matching, PDF validation and XML writing. Datasets are
+generated before the clock starts.
+
+    python -m benchmarks.bench_pipelines --keys 1000 --keys 100000 --output results.json
+"""
+
+import contextlib
+import json
+import logging
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import click
+
+from digitization.file_import.file_import import create_import_xml_files
+from refactory.check_files.main import run_validation_pipeline
+from refactory.file_import.boite_matcher import BoiteS3Matcher
+
+from .synthetic import (
+    BASE_PATH,
+    InMemoryProvider,
+    InMemoryS3Client,
+    make_dataset,
+    write_boites,
+    write_record_tree,
+)
+
+
+@contextlib.contextmanager
+def quiet():
+    """Silences the per-file progress output and starts from unconfigured logging, like a fresh CLI process."""
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    root.handlers.clear()
+    root.setLevel(logging.WARNING)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(
+        devnull
+    ), contextlib.redirect_stderr(devnull):
+        try:
+            yield
+        finally:
+            for handler in root.handlers:
+                handler.close()
+            root.handlers[:] = handlers
+            root.setLevel(level)
+
+
+def timed(fn, *args, **kwargs) -> tuple[float, object]:
+    with quiet():
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        return time.perf_counter() - start, result
+
+
+def bench_file_match(dataset, workdir: str) -> dict:
+    boites_dir = os.path.join(workdir, "boites")
+    write_boites(dataset, boites_dir)
+    matcher = BoiteS3Matcher(
+        InMemoryProvider(dataset.objects),
+        BASE_PATH,
+        boites_dir,
+        os.path.join(workdir, "match_results"),
+    )
+    seconds, results = timed(matcher.execute)
+    return {
+        "seconds": seconds,
+        "boites": len(results),
+        "rows": sum(len(records) for records in results.values()),
+    }
+
+
+def bench_validation(dataset, workdir: str) -> dict:
+    log_file = os.path.join(workdir, "pdf_issues.log")
+    seconds, _ = timed(
+        run_validation_pipeline,
+        InMemoryProvider(dataset.objects),
+        f"{BASE_PATH}/PDF/",
+        log_file,
+        dataset.box_numbers,
+    )
+    with open(log_file.replace(".log", ".json"), "r", encoding="utf-8") as f:
+        statistics = json.load(f)["statistics"]
+    return {
+        "seconds": seconds,
+        "valid": statistics["valid_files_count"],
+        "corrupted": statistics["corrupted_files_count"],
+    }
+
+
+def bench_import_xml(dataset, workdir: str) -> dict:
+    boites_dir = os.path.join(workdir, "boites")
+    write_boites(dataset, boites_dir)
+    output_dir = os.path.join(workdir, "import")
+    os.makedirs(output_dir)
+    seconds, _ = timed(
+        create_import_xml_files,
+        boites_dir,
+        output_dir,
+        s3_client=InMemoryS3Client(dataset.objects),
+    )
+    return {
+        "seconds": seconds,
+        "combined_xml_bytes": os.path.getsize(os.path.join(output_dir, "combined.xml")),
+    }
+
+
+def bench_collection(dataset, workdir: str) -> dict:
+    # Imported here: the SFTP side of this module needs pysftp
+    from digitization.xml_collect.utils import records_collection_creation
+
+    records_dir = os.path.join(workdir, "records")
+    files = write_record_tree(dataset, records_dir)
+    output_dir = os.path.join(workdir, "collections")
+    seconds, _ = timed(records_collection_creation, records_dir, output_dir)
+    return {
+        "seconds": seconds,
+        "record_files": files,
+        "collection_files": len(os.listdir(output_dir)),
+    }
+
+
+BENCHMARKS = {
+    "file_match": bench_file_match,
+    "validation": bench_validation,
+    "import_xml": bench_import_xml,
+    "collection": bench_collection,
+}
+
+
+def run(name: str, dataset) -> dict:
+    with tempfile.TemporaryDirectory(prefix=f"bench-{name}-") as workdir:
+        result = BENCHMARKS[name](dataset, workdir)
+    return {
+        "benchmark": name,
+        "keys": dataset.keys,
+        "records": dataset.records,
+        **result,
+        "seconds": round(result["seconds"], 4),
+        "keys_per_second": round(dataset.keys / result["seconds"], 1)
+        if result["seconds"]
+        else None,
+    }
+
+
+def environment() -> dict:
+    try:
+        revision = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_revision": revision,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+@click.command()
+@click.option(
+    "--keys",
+    multiple=True,
+    type=int,
+    default=(1000, 100000, 1000000),
+    show_default=True,
+    help="Dataset sizes, in storage keys (two per record).",
+)
+@click.option(
+    "-b",
+    "--benchmark",
+    "names",
+    multiple=True,
+    type=click.Choice(list(BENCHMARKS)),
+    default=list(BENCHMARKS),
+    show_default=True,
+)
+@click.option(
+    "-o",
+    "--output",
+    default=None,
+    help="Also write every result, with the environment, to this JSON file.",
+)
+def main(keys, names, output):
+    """Times file-match, validation, import XML and collection creation on synthetic data."""
+    results = []
+    for count in keys:
+        dataset = make_dataset(count)
+        for name in names:
+            result = run(name, dataset)
+            results.append(result)
+            click.echo(json.dumps(result))
+
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump({"environment": environment(), "results": results}, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Compares per-call boto3 presigning with BulkPresigner.
+
+Runs offline: presigning only needs credentials, so fake ones are used.
+
+    python -m benchmarks.bench_presign --keys 100000
+"""
+
+import json
+import time
+
+import boto3
+import click
+from botocore.config import Config
+
+from refactory.presign import BulkPresigner
+
+BUCKET = "digitization-dev"
+
+
+def make_keys(count: int) -> list[str]:
+    return [
+        f"cern-archives/raw/PDF/BOITE_O0{125 + i // 5000}/REC-{i:07d}-ps/REC-{i:07d}-ps.pdf"
+        for i in range(count)
+    ]
+
+
+def presign_with_boto3(client, keys: list[str], expiration: int) -> list[str]:
+    return [
+        client.generate_presigned_url(
+            ClientMethod="get_object",
+            Params={
+                "Bucket": BUCKET,
+                "Key": key,
+                "ResponseContentType": "application/pdf",
+            },
+            ExpiresIn=expiration,
+        )
+        for key in keys
+    ]
+
+
+def verify(client, presigner: BulkPresigner, keys: list[str], expiration: int) -> bool:
+    """Checks both paths give the same URLs, retrying if a second boundary is crossed."""
+    for _ in range(3):
+        now = time.time()
+        bulk_urls = presigner.presign(keys, expiration, "application/pdf", now=now)
+        boto_urls = presign_with_boto3(client, keys, expiration)
+        if int(time.time()) == int(now):
+            return bulk_urls == boto_urls
+    return False
+
+
+def run(count: int, signature_version: str | None) -> dict:
+    session = boto3.session.Session(
+        aws_access_key_id="BENCHMARKACCESSKEY",
+        aws_secret_access_key="benchmark-secret-key",
+    )
+    config = Config(signature_version=signature_version) if signature_version else None
+    client = session.client("s3", endpoint_url="https://s3.cern.ch", config=config)
+    keys = make_keys(count)
+    expiration = 86400 * (7 if signature_version else 365)
+
+    start = time.perf_counter()
+    presign_with_boto3(client, keys, expiration)
+    boto_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    presigner = BulkPresigner(client, BUCKET, session.get_credentials())
+    presigner.presign(keys, expiration, "application/pdf")
+    bulk_seconds = time.perf_counter() - start
+
+    return {
+        "benchmark": "presign",
+        "signature": "s3v4" if presigner.sigv4 else "s3-query",
+        "keys": count,
+        "boto3_seconds": round(boto_seconds, 4),
+        "bulk_seconds": round(bulk_seconds, 4),
+        "speedup": round(boto_seconds / bulk_seconds, 1) if bulk_seconds else None,
+        "identical": verify(client, presigner, keys[:100], expiration),
+    }
+
+
+@click.command()
+@click.option("--keys", "count", default=100000, show_default=True, type=int)
+def main(count):
+    """Times boto3 generate_presigned_url against BulkPresigner.presign."""
+    for signature_version in (None, "s3v4"):
+        click.echo(json.dumps(run(count, signature_version)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+Synthetic Boites, key trees and PDFs, with in-memory stand-ins for S3.
+
+Every record of the generated dataset has a PDF and a PDF_LATEX object, so a
+dataset of `keys` objects describes `keys // 2` records spread over Boites of
+`box_size` rows. A fraction of the Boite rows name records that are not in
+storage, and a fraction of the PDFs are truncated, so matching and validation
+both have something to report.
+"""
+
+import bisect
+import hashlib
+import io
+import os
+from dataclasses import dataclass, field
+
+import boto3
+import pandas as pd
+from pypdf import PdfWriter
+
+from refactory.presign import BulkPresigner
+from refactory.storage_connection import StorageProvider
+
+BUCKET = "digitization-dev"
+BASE_PATH = "cern-archives/raw"
+FIRST_BOX = 125
+
+
+def make_pdf() -> bytes:
+    writer = PdfWriter()
+    writer.add_blank_page(width=595, height=842)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+VALID_PDF = make_pdf()
+# Cut before the trailer: rejected by the header/trailer check and by pypdf
+CORRUPTED_PDF = VALID_PDF[: len(VALID_PDF) // 2]
+
+
+@dataclass
+class Dataset:
+    keys: int
+    box_size: int = 5000
+    missing_every: int = 20
+    corrupt_every: int = 10
+    objects: dict[str, bytes] = field(default_factory=dict)
+    boites: dict[str, list[tuple[int, str]]] = field(default_factory=dict)
+
+    @property
+    def records(self) -> int:
+        return self.keys // 2
+
+    @property
+    def box_numbers(self) -> list[int]:
+        return sorted({FIRST_BOX + i // self.box_size for i in range(self.records)})
+
+
+def make_dataset(
+    keys: int, box_size: int = 5000, missing_every: int = 20, corrupt_every: int = 10
+) -> Dataset:
+    """Builds the object tree under BASE_PATH and the rows of every Boite."""
+    dataset = Dataset(keys, box_size, missing_every, corrupt_every)
+    for i in range(dataset.records):
+        box = f"BOITE_O0{FIRST_BOX + i // box_size}"
+        name = f"REC-{i:07d}-ps"
+        pdf = CORRUPTED_PDF if i % corrupt_every == 0 else VALID_PDF
+        dataset.objects[f"{BASE_PATH}/PDF/{box}/{name}/{name}.pdf"] = pdf
+        dataset.objects[f"{BASE_PATH}/PDF_LATEX/{box}/{name}_latex.pdf"] = VALID_PDF
+        # These rows find nothing in storage, and the record's objects are left unmatched
+        row_name = f"{name}-missing" if i % missing_every == 0 else name
+        dataset.boites.setdefault(box, []).append((100000 + i, row_name))
+    return dataset
+
+
+def write_boites(dataset: Dataset, directory: str) -> list[str]:
+    """Writes one `BOITE_O0<n>.xlsx` per Boite, without header, as the inventories are."""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for box, rows in dataset.boites.items():
+        path = os.path.join(directory, f"{box}.xlsx")
+        pd.DataFrame(rows).to_excel(path, header=False, index=False)
+        paths.append(path)
+    return paths
+
+
+def write_record_tree(dataset: Dataset, directory: str) -> int:
+    """Writes one MARCXML record per record, as the SFTP deliveries lay them out."""
+    for i in range(dataset.records):
+        name = f"REC-{i:07d}-ps"
+        record_dir = os.path.join(directory, f"BOITE_O0{FIRST_BOX + i // dataset.box_size}", name)
+        os.makedirs(record_dir, exist_ok=True)
+        with open(os.path.join(record_dir, f"{name}.xml"), "w") as f:
+            f.write(
+                "<collection><record>"
+                f'<controlfield tag="001">{100000 + i}</controlfield>'
+                '<datafield tag="FFT" ind1=" " ind2=" ">'
+                f'<subfield code="a">[PATH]/{name}.pdf</subfield>'
+                "</datafield></record></collection>\n"
+            )
+    return dataset.records
+
+
+def offline_s3_client():
+    """A real boto3 client with fake credentials: presigning works, nothing reaches the network."""
+    session = boto3.session.Session(
+        aws_access_key_id="BENCHMARKACCESSKEY",
+        aws_secret_access_key="benchmark-secret-key",
+    )
+    return session, session.client("s3", endpoint_url="https://s3.cern.ch")
+
+
+class InMemoryProvider(StorageProvider):
+    """
+    `StorageProvider` over a dataset held in memory, with S3 prefix semantics
+    and the same presigning as `S3Provider`.
+    """
+
+    def __init__(self, objects: dict[str, bytes]):
+        self.objects = objects
+        self.keys = sorted(objects)
+        self._etags = {
+            blob: hashlib.md5(blob).hexdigest() for blob in set(objects.values())
+        }
+        session, self.s3 = offline_s3_client()
+        self._presigner = BulkPresigner(self.s3, BUCKET, session.get_credentials())
+
+    def _keys_under(self, prefix: str) -> list[str]:
+        start = bisect.bisect_left(self.keys, prefix)
+        end = bisect.bisect_left(self.keys, prefix + "\U0010ffff")
+        return self.keys[start:end]
+
+    def list_folders(self, base_path: str) -> list[str]:
+        folders = {
+            base_path + key[len(base_path) :].split("/", 1)[0] + "/"
+            for key in self._keys_under(base_path)
+            if "/" in key[len(base_path) :]
+        }
+        return sorted(folders)
+
+    def list_file_entries(self, folder_path: str, extension: str = None) -> list[dict]:
+        return [
+            {
+                "key": key,
+                "size": len(self.objects[key]),
+                "etag": self._etags[self.objects[key]],
+            }
+            for key in self._keys_under(folder_path)
+            if extension is None or key.lower().endswith(extension.lower())
+        ]
+
+    def list_files(self, folder_path: str, extension: str = None) -> list[str]:
+        return [entry["key"] for entry in self.list_file_entries(folder_path, extension)]
+
+    def download_to_temp(self, file_path: str, temp_file_path: str) -> None:
+        with open(temp_file_path, "wb") as f:
+            f.write(self.objects[file_path])
+
+    def download_to_buffer(self, file_path: str, max_size: int) -> bytes | None:
+        data = self.objects[file_path]
+        return data if len(data) <= max_size else None
+
+    def read_range(self, file_path: str, start: int, end: int = None) -> bytes:
+        data = self.objects[file_path]
+        if start < 0:
+            return data[start:]
+        return data[start : None if end is None else end + 1]
+
+    def upload_file(self, local_file_path: str, remote_file_path: str) -> None:
+        with open(local_file_path, "rb") as f:
+            self.objects[remote_file_path] = f.read()
+
+    def generate_presigned_urls(
+        self, file_keys: list[str], file_type: str, content_type: str = None
+    ) -> list[str]:
+        return self._presigner.presign(file_keys, 86400 * 365, content_type)
+
+    def generate_presigned_url(
+        self, file_key: str, file_type: str = None, content_type: str = None
+    ) -> str:
+        return self.generate_presigned_urls([file_key], file_type, content_type)[0]
+
+
+class InMemoryS3Client:
+    """
+    The part of the boto3 S3 client the `digitization` import uses. Buckets are
+    the first path component of the dataset keys (`cern-archives/...`); listing
+    pages hold 1000 keys like S3, and presigning is delegated to a real client.
+    """
+
+    PAGE_SIZE = 1000
+
+    def __init__(self, objects: dict[str, bytes]):
+        self.keys = sorted(objects)
+        _, self._client = offline_s3_client()
+
+    def get_paginator(self, operation_name: str):
+        assert operation_name == "list_objects_v2"
+        return self
+
+    def paginate(self, Bucket: str, Prefix: str = ""):
+        prefix = f"{Bucket}/{Prefix}"
+        start = bisect.bisect_left(self.keys, prefix)
+        end = bisect.bisect_left(self.keys, prefix + "\U0010ffff")
+        for page_start in range(start, end, self.PAGE_SIZE):
+            page = self.keys[page_start : min(page_start + self.PAGE_SIZE, end)]
+            yield {"Contents": [{"Key": key[len(Bucket) + 1 :]} for key in page]}
+
+    def generate_presigned_url(self, **kwargs) -> str:
+        return self._client.generate_presigned_url(**kwargs)
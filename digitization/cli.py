@@ -16,26 +16,48 @@ def digitization():
 
 @digitization.command()
 @click.option("--force", default=False, show_default=True, is_flag=True)
+@click.option(
+    "--connections",
+    default=1,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of parallel SFTP connections.",
+)
+@click.option(
+    "--sync",
+    default=False,
+    show_default=True,
+    is_flag=True,
+    help="Transfer only new or changed files of every directory, using the local manifest.",
+)
 @click.option("--fix-eos-paths", default=False, show_default=True, is_flag=True)
 @click.option("--fix-white-spaces", default=False, show_default=True, is_flag=True)
 @click.option(
     "--create-collection-file", default=False, show_default=True, is_flag=True
 )
-def download(force, fix_eos_paths, fix_white_spaces, create_collection_file):
+@click.option(
+    "--workers",
+    default=os.cpu_count(),
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of processes fixing EOS paths, one top-level directory each.",
+)
+def download(
+    force, connections, sync, fix_eos_paths, fix_white_spaces, create_collection_file, workers
+):
     """Download files from ftp."""
 
     click.echo("Downloading new files.")
-    downloaded_directories = download_files_from_ftp(force=force)
-    download_directory = os.getenv("DOWNLOAD_DIR", "/tmp/")
-
     if fix_white_spaces:
-        click.echo("Fixing white spaces in directories and files.")
-        for directory in downloaded_directories:
-            fix_white_spaces_in_directory(os.path.join(download_directory, directory))
+        click.echo("Downloading to names without white spaces.")
+    downloaded_directories = download_files_from_ftp(
+        force=force, connections=connections, sync=sync, fix_white_spaces=fix_white_spaces
+    )
+    download_directory = os.getenv("DOWNLOAD_DIR", "/tmp/")
 
     if fix_eos_paths:
         click.echo("Fixing paths in xml.")
-        find_all_xmls()
+        find_all_xmls(workers=workers)
 
     if create_collection_file:
         click.echo("Creating collection file.")
@@ -48,18 +70,39 @@ def download(force, fix_eos_paths, fix_white_spaces, create_collection_file):
 
 
 @digitization.command("fix-eos-paths")
-def fix_eos_paths():
+@click.option(
+    "--workers",
+    default=os.cpu_count(),
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of processes fixing EOS paths, one top-level directory each.",
+)
+def fix_eos_paths(workers):
     """Fix EOS paths."""
     click.echo("Fixing paths in xml")
-    find_all_xmls()
+    find_all_xmls(workers=workers)
 
 
 @digitization.command("fix-white-spaces")
 @click.option("-d", "--start-from-dir", type=str)
-def fix_white_spaces(start_from_dir):
+@click.option(
+    "--dry-run",
+    default=False,
+    show_default=True,
+    is_flag=True,
+    help="Print the renames and collisions without renaming anything.",
+)
+@click.option(
+    "--workers",
+    default=8,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of renames run in parallel within a directory level.",
+)
+def fix_white_spaces(start_from_dir, dry_run, workers):
     """Fix white spaces."""
     click.echo(f"Fixing white spaces in directories and files. {start_from_dir}")
-    fix_white_spaces_in_directory(start_from_dir)
+    fix_white_spaces_in_directory(start_from_dir, dry_run=dry_run, workers=workers)
 
 
 @digitization.command("create-collection-file")
@@ -84,11 +127,42 @@ def create_import_xml(data_path, output_path):
     click.echo("✅ XML files created successfully.")
 
 
+def open_listing_cache(listing_cache, cache_ttl, refresh_cache):
+    """Opens the S3 listing cache shared with digitization_v2, which needs the refactory package."""
+    if not listing_cache:
+        return None
+    try:
+        from refactory.listing_cache import S3ListingCache
+    except ImportError:
+        raise click.UsageError(
+            "--listing-cache needs the refactory package, which this installation does not ship."
+        )
+    return S3ListingCache(listing_cache, ttl=cache_ttl, refresh=refresh_cache)
+
+
 @digitization.command("get-s3-matching-errors")
 @click.option("-d", "--data-path", type=str, required=True, help="Path to the boite data files folder.")
 @click.option("-o", "--log-path", type=str, required=True, help="Path to save the log file.")
-def get_s3_matching_errors(data_path, log_path):
+@click.option(
+    "--listing-cache",
+    default=None,
+    help="Path to a SQLite file caching S3 listings across runs, shared with digitization_v2 (disabled by default).",
+)
+@click.option(
+    "--cache-ttl",
+    default=86400,
+    show_default=True,
+    type=int,
+    help="Seconds a cached S3 listing is reused before it is listed again.",
+)
+@click.option(
+    "--refresh-cache",
+    is_flag=True,
+    help="Revalidate every cached prefix used in this run against S3.",
+)
+def get_s3_matching_errors(data_path, log_path, listing_cache, cache_ttl, refresh_cache):
     """Log missing files in S3 and Excel."""
+    cache = open_listing_cache(listing_cache, cache_ttl, refresh_cache)
     log_file = os.path.join(log_path, "matching_errors.log")
     logging.basicConfig(
         filename=log_file,
@@ -96,7 +170,7 @@ def get_s3_matching_errors(data_path, log_path):
         format="%(asctime)s - %(levelname)s - %(message)s",
     )
     for box_file in os.listdir(data_path):
-        matching_errors = get_matching_errors(data_path, box_file, False)
+        matching_errors = get_matching_errors(data_path, box_file, False, cache)
         for filetype, missing_files in matching_errors["missing_in_excel"].items():
             if missing_files:
                 logging.warning(
@@ -111,6 +185,13 @@ def get_s3_matching_errors(data_path, log_path):
                 )
             else:
                 logging.info(f"[{box_file}] No missing files in S3 for {filetype}.")
+    if cache is not None:
+        stats = cache.stats
+        click.echo(
+            f"Listing cache: {stats['hits']} hits, {stats['misses']} misses "
+            f"({stats['changed']} changed, {stats['unchanged']} unchanged prefixes)."
+        )
+        cache.close()
     click.echo(f"✅ Log file created: {log_file}")
 
 
@@ -2,11 +2,11 @@ import os
 import logging
 import pandas as pd
 from tqdm import tqdm
-from .utils import generate_s3_url, get_s3_client, get_s3_file_path, list_s3_files_and_folders, create_custom_xml, transform_box_file_name, combine_xml_files
+from .utils import generate_s3_url, get_s3_client, list_s3_files_and_folders, MarcXmlWriter, transform_box_file_name, combine_xml_files, build_s3_record_index, lookup_s3_record_index
 
 
 
-def process_row(row, box_file, s3_client):
+def process_row(row, box_file, s3_client, s3_index):
     record_id = str(row[0])
     record_name = str(row[1])
     
@@ -18,29 +18,25 @@ def process_row(row, box_file, s3_client):
     }
 
     for filetype in ['PDF', 'PDF_LATEX']:
-        s3_prefix = get_s3_file_path(filetype=filetype, box_file=box_file, filename=record_name)
-        files = list_s3_files_and_folders('cern-archives', s3_prefix, s3_client)['files']
-        if not files:
-            s3_prefix = get_s3_file_path(filetype=filetype, box_file=box_file, filename=record_name.upper())
-            files = list_s3_files_and_folders('cern-archives', s3_prefix, s3_client)['files']
+        files = lookup_s3_record_index(s3_index, filetype, record_name)
         if not files:
             logging.info(f"[MISSING] [{box_file}]: {filetype} for record {record_name} (ID: {record_id})")
             continue
 
-        for file in files:
-            if filetype == 'PDF':
-                s3_url = generate_s3_url('cern-archives', file, True, s3_client=s3_client)
-                record_data['pdf_url'] = s3_url
-            elif filetype == 'PDF_LATEX':
-                s3_url = generate_s3_url('cern-archives', file, True, s3_client=s3_client)
-                record_data['pdf_latex_url'] = s3_url
+        # The last listed key wins, as with the former per-row listing
+        s3_url = generate_s3_url('cern-archives', files[-1], True, s3_client=s3_client)
+        if filetype == 'PDF':
+            record_data['pdf_url'] = s3_url
+        elif filetype == 'PDF_LATEX':
+            record_data['pdf_latex_url'] = s3_url
     return record_data
 
 
-def create_import_xml_files(data_path, output_path):
+def create_import_xml_files(data_path, output_path, s3_client=None):
     logging.basicConfig(filename=os.path.join(output_path, 'missing_records.log'), level=logging.INFO,
                     format='%(asctime)s - %(message)s')
-    s3_client = get_s3_client()
+    if s3_client is None:
+        s3_client = get_s3_client()
     xml_output_path = os.path.join(output_path, 'import_xml_files')
     os.makedirs(xml_output_path, exist_ok=True)
     
@@ -51,12 +47,13 @@ def create_import_xml_files(data_path, output_path):
             continue
         print(f"Start processing {box_file}")
         df = pd.read_excel(os.path.join(data_path, box_file), header=None)
-        records_data = []
-        for _, row in tqdm(df.iterrows(), total=df.shape[0], desc=f"Processing {box_file}"):
-            records_data.append(process_row(row, box_file, s3_client))
+        s3_index = build_s3_record_index('cern-archives', box_file, s3_client)
         xml_filename = os.path.splitext(box_file)[0] + ".xml"
         xml_path = os.path.join(xml_output_path, xml_filename)
-        create_custom_xml(records_data, xml_path)
+        # Each record is written as soon as it is resolved
+        with MarcXmlWriter(xml_path) as writer:
+            for _, row in tqdm(df.iterrows(), total=df.shape[0], desc=f"Processing {box_file}"):
+                writer.write_record(process_row(row, box_file, s3_client, s3_index))
         xml_files.append(xml_path)
         print(f"✅ XML written: {xml_path}")
     
@@ -67,13 +64,14 @@ def create_import_xml_files(data_path, output_path):
     
 
 
-def get_matching_errors(boite_data_path, box_file, corrections_folder=False):
+def get_matching_errors(boite_data_path, box_file, corrections_folder=False, listing_cache=None):
     """
     This function reads the Excel file and returns a dict:
     {
       'missing_in_excel': {filetype: [...], ...},
       'missing_in_s3': {filetype: [...], ...}
     }
+    The S3 listings go through listing_cache when one is given.
     """
     s3_client = get_s3_client()
     boite_data = pd.read_excel(os.path.join(boite_data_path, box_file), header=None)
@@ -86,7 +84,7 @@ def get_matching_errors(boite_data_path, box_file, corrections_folder=False):
 
     for ft in filetypes:
         prefix = f'raw/CORRECTIONS/{ft}/{box_file_s3}/' if corrections_folder else f'raw/{ft}/{box_file_s3}/'
-        files_for_type = list_s3_files_and_folders('cern-archives', prefix, s3_client)
+        files_for_type = list_s3_files_and_folders('cern-archives', prefix, s3_client, listing_cache)
         if ft == 'PDF_LATEX':
             s3_names = [f.split('/')[-1].split('_latex.')[0] for f in files_for_type['files']]
         else:
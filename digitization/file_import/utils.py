@@ -1,8 +1,6 @@
 import os
 import boto3
 from dotenv import load_dotenv
-import xml.etree.ElementTree as ET
-from xml.dom import minidom
 load_dotenv()
 
 
@@ -25,10 +23,23 @@ def get_s3_client():
         endpoint_url='https://s3.cern.ch',
     )
 
-def list_s3_files_and_folders(bucket_name, prefix, s3_client=None):
+def list_s3_files_and_folders(bucket_name, prefix, s3_client=None, listing_cache=None):
+    """
+    Lists the files and folders directly under prefix. With a listing_cache
+    (refactory.listing_cache.S3ListingCache), a fresh stored listing is served
+    instead, and new listings are stored in it.
+    """
     if s3_client is None:
         s3_client = boto3.client('s3')
 
+    if listing_cache is not None:
+        entries = listing_cache.get(bucket_name, prefix, 'delimited')
+        if entries is not None:
+            return {
+                'files': [e['key'] for e in entries if not e['key'].endswith('/')],
+                'folders': [e['key'] for e in entries if e['key'].endswith('/')],
+            }
+
     try:
         response = s3_client.list_objects_v2(
             Bucket=bucket_name,
@@ -43,14 +54,77 @@ def list_s3_files_and_folders(bucket_name, prefix, s3_client=None):
             folders = [cp['Prefix'] for cp in response['CommonPrefixes']]
 
         if 'Contents' in response:
-            files = [obj['Key'] for obj in response['Contents'] if not obj['Key'].endswith('/')]
-
-        return {'files': files, 'folders': folders}
+            files = [obj for obj in response['Contents'] if not obj['Key'].endswith('/')]
 
     except Exception as e:
         print(f"Error listing S3 path: {e}")
         return {'files': [], 'folders': []}
 
+    if listing_cache is not None:
+        listing_cache.put(
+            bucket_name,
+            prefix,
+            'delimited',
+            [{'key': folder} for folder in folders]
+            + [
+                {
+                    'key': obj['Key'],
+                    'size': obj.get('Size'),
+                    'etag': obj.get('ETag', '').strip('"') or None,
+                    'last_modified': obj['LastModified'].isoformat() if obj.get('LastModified') else None,
+                }
+                for obj in files
+            ],
+        )
+    return {'files': [obj['Key'] for obj in files], 'folders': folders}
+
+
+def list_s3_keys(bucket_name, prefix, s3_client):
+    keys = []
+    try:
+        paginator = s3_client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+            keys.extend(obj['Key'] for obj in page.get('Contents', []) if not obj['Key'].endswith('/'))
+    except Exception as e:
+        print(f"Error listing S3 path: {e}")
+    return keys
+
+
+def build_s3_record_index(bucket_name, box_file, s3_client):
+    """
+    Lists every raw/{filetype}/{BOX}/ prefix once and returns an index:
+    {filetype: {casefolded_record_name: {record_name: [keys]}}}
+
+    The exact record name is kept under the case-folded entry so lookups can
+    apply the same exact / upper-cased matching rules as the per-row listing.
+    """
+    box = transform_box_file_name(box_file)
+    index = {}
+    for filetype in ['PDF', 'PDF_LATEX']:
+        prefix = f"raw/{filetype}/{box}/"
+        entries = {}
+        for key in list_s3_keys(bucket_name, prefix, s3_client):
+            relative = key[len(prefix):]
+            if filetype == 'PDF':
+                # raw/PDF/{BOX}/{record_name}/{file}
+                parts = relative.split('/')
+                if len(parts) != 2:
+                    continue
+                record_name = parts[0]
+            else:
+                # raw/PDF_LATEX/{BOX}/{record_name}_latex.pdf
+                if '/' in relative or '_latex.pdf' not in relative:
+                    continue
+                record_name = relative.split('_latex.pdf')[0]
+            entries.setdefault(record_name.casefold(), {}).setdefault(record_name, []).append(key)
+        index[filetype] = entries
+    return index
+
+
+def lookup_s3_record_index(index, filetype, record_name):
+    candidates = index.get(filetype, {}).get(record_name.casefold(), {})
+    return candidates.get(record_name) or candidates.get(record_name.upper()) or []
+
 
 def generate_s3_url(bucket_name, file_key, pdf, expiration=31556952, s3_client=None):
     params = {
@@ -67,43 +141,95 @@ def generate_s3_url(bucket_name, file_key, pdf, expiration=31556952, s3_client=N
         )
 
 
-def create_custom_xml(records_data, output_file_path):
-    collection = ET.Element("collection")
-    for rec in records_data:
+def _escape_xml(value):
+    # Same escaping as minidom's pretty printer, so streamed output is unchanged
+    return (
+        str(value)
+        .replace("&", "&amp;")
+        .replace("<", "&lt;")
+        .replace('"', "&quot;")
+        .replace(">", "&gt;")
+    )
+
+
+def _fft_datafield(url, description):
+    return (
+        '        <datafield tag="FFT" ind1=" " ind2=" ">\n'
+        f'            <subfield code="a">{_escape_xml(url)}</subfield>\n'
+        '            <subfield code="t">Main</subfield>\n'
+        f'            <subfield code="d">{description}</subfield>\n'
+        '        </datafield>\n'
+    )
+
+
+class MarcXmlWriter:
+    """
+    Writes a MARCXML <collection> one <record> at a time, with the same layout
+    minidom's toprettyxml produced, so memory does not grow with the record count.
+    """
+
+    def __init__(self, output_file_path):
+        self.output_file_path = output_file_path
+        self.records_written = 0
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.output_file_path, "w", encoding="utf-8")
+        self._file.write('<?xml version="1.0" ?>\n')
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.records_written:
+            self._file.write("</collection>\n")
+        else:
+            self._file.write("<collection/>\n")
+        self._file.close()
+
+    def _open_collection(self):
+        if not self.records_written:
+            self._file.write("<collection>\n")
+        self.records_written += 1
+
+    def write_record(self, rec):
+        """Writes one record; records without any URL are skipped. Returns True if written."""
         if not rec.get('pdf_url') and not rec.get('pdf_latex_url'):
-            continue
-        record_elem = ET.SubElement(collection, "record")
-        controlfield = ET.SubElement(record_elem, "controlfield", tag="001")
-        controlfield.text = str(rec['record_id'])
+            return False
+        record_id = _escape_xml(rec['record_id'])
+        parts = ["    <record>\n"]
+        if record_id:
+            parts.append(f'        <controlfield tag="001">{record_id}</controlfield>\n')
+        else:
+            parts.append('        <controlfield tag="001"/>\n')
         if rec.get('pdf_url'):
-            datafield = ET.SubElement(record_elem, "datafield", tag="FFT", ind1=" ", ind2=" ")
-            ET.SubElement(datafield, "subfield", code="a").text = rec['pdf_url']
-            ET.SubElement(datafield, "subfield", code="t").text = "Main"
-            ET.SubElement(datafield, "subfield", code="d").text = "Fulltext PDF"
+            parts.append(_fft_datafield(rec['pdf_url'], "Fulltext PDF"))
         if rec.get('pdf_latex_url'):
-            datafield = ET.SubElement(record_elem, "datafield", tag="FFT", ind1=" ", ind2=" ")
-            ET.SubElement(datafield, "subfield", code="a").text = rec['pdf_latex_url']
-            ET.SubElement(datafield, "subfield", code="t").text = "Main"
-            ET.SubElement(datafield, "subfield", code="d").text = "Fulltext PDF_LaTeX"
-    rough_string = ET.tostring(collection, encoding="utf-8")
-    reparsed = minidom.parseString(rough_string)
-    pretty_xml = reparsed.toprettyxml(indent="    ")
-    with open(output_file_path, "w", encoding="utf-8") as f:
-        f.write(pretty_xml)
+            parts.append(_fft_datafield(rec['pdf_latex_url'], "Fulltext PDF_LaTeX"))
+        parts.append("    </record>\n")
+        self._open_collection()
+        self._file.write("".join(parts))
+        return True
+
+    def copy_records(self, xml_file):
+        """Streams the <record> elements of a file written by MarcXmlWriter, line by line."""
+        with open(xml_file, "r", encoding="utf-8") as f:
+            in_record = False
+            for line in f:
+                if line == "    <record>\n":
+                    in_record = True
+                    self._open_collection()
+                if in_record:
+                    self._file.write(line)
+                if line == "    </record>\n":
+                    in_record = False
+
+
+def create_custom_xml(records_data, output_file_path):
+    with MarcXmlWriter(output_file_path) as writer:
+        for rec in records_data:
+            writer.write_record(rec)
 
-def combine_xml_files(xml_files, output_file_path):
-    combined_collection = ET.Element("collection")
-    
-    for xml_file in xml_files:
-        tree = ET.parse(xml_file)
-        root = tree.getroot()
-        for record in root.findall('record'):
-            combined_collection.append(record)
-    
-    rough_string = ET.tostring(combined_collection, encoding="utf-8")
-    reparsed = minidom.parseString(rough_string)
-    pretty_xml = reparsed.toprettyxml(indent="    ")
-    
-    with open(output_file_path, "w", encoding="utf-8") as f:
-        f.write(pretty_xml)
 
+def combine_xml_files(xml_files, output_file_path):
+    with MarcXmlWriter(output_file_path) as writer:
+        for xml_file in xml_files:
+            writer.copy_records(xml_file)
@@ -0,0 +1,408 @@
+import json
+import os
+import posixpath
+import stat
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import click
+from tqdm import tqdm
+
+# Files above this size are split into segments fetched over several connections
+SEGMENT_SIZE = 256 * 1024 * 1024
+READ_SIZE = 1024 * 1024
+IN_PROGRESS_MARKER = ".sftp-download-in-progress"
+MANIFEST_FILE = ".sftp-manifest.json"
+
+
+class SftpConnectionPool:
+    """One SFTP connection per worker thread, opened on first use."""
+
+    def __init__(self, connect):
+        self._connect = connect
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+
+    def get(self):
+        sftp = getattr(self._local, "sftp", None)
+        if sftp is None:
+            sftp = self._local.sftp = self._connect()
+            with self._lock:
+                self._connections.append(sftp)
+        return sftp
+
+    def close(self):
+        with self._lock:
+            for sftp in self._connections:
+                sftp.close()
+            self._connections.clear()
+
+
+def list_remote_tree(sftp, remote_dir):
+    """Returns (directories, files) below remote_dir; files are (path, size, mtime)."""
+    directories, files, pending = [remote_dir], [], [remote_dir]
+    while pending:
+        current = pending.pop()
+        for attr in sftp.listdir_attr(current):
+            path = posixpath.join(current, attr.filename)
+            if stat.S_ISDIR(attr.st_mode):
+                directories.append(path)
+                pending.append(path)
+            else:
+                files.append((path, attr.st_size, attr.st_mtime))
+    return directories, files
+
+
+def load_manifest(manifest_path):
+    """Returns {remote path relative to the root: [size, mtime]} of every file synced so far."""
+    try:
+        with open(manifest_path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(manifest_path, manifest):
+    with open(f"{manifest_path}.part", "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(f"{manifest_path}.part", manifest_path)
+
+
+def _load_part_state(part_path):
+    """Returns the sidecar of a .part file: the remote size and mtime it belongs to, and its done segments."""
+    try:
+        with open(f"{part_path}.json", "r") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return state if isinstance(state, dict) else {}
+
+
+class _FileTransfer:
+    """Tracks the outstanding byte ranges of one remote file and finalizes it."""
+
+    def __init__(self, remote_path, local_path, size, mtime, segmented):
+        self.remote_path = remote_path
+        self.local_path = local_path
+        self.part_path = f"{local_path}.part"
+        self.size = size
+        self.mtime = mtime
+        self.segmented = segmented
+        self.done_segments = set()
+        self.remaining = 0
+        self.failed = False
+        self.completed = False
+        self.lock = threading.Lock()
+
+    def plan(self):
+        """
+        Returns the (offset, length) ranges still to fetch. A previous .part file
+        is reused only if its sidecar records the same remote size and mtime.
+        """
+        os.makedirs(os.path.dirname(self.local_path), exist_ok=True)
+        part_size = os.path.getsize(self.part_path) if os.path.exists(self.part_path) else -1
+        state = _load_part_state(self.part_path)
+        reusable = (
+            state.get("size") == self.size
+            and state.get("mtime") == int(self.mtime)
+            and state.get("segmented", False) == self.segmented
+        )
+
+        if self.segmented:
+            if reusable and part_size == self.size:
+                self.done_segments = set(state.get("segments", []))
+            else:
+                self.done_segments = set()
+                with open(self.part_path, "wb") as f:
+                    f.truncate(self.size)
+                self._save_state()
+            ranges = [
+                (offset, min(SEGMENT_SIZE, self.size - offset))
+                for offset in range(0, self.size, SEGMENT_SIZE)
+                if offset not in self.done_segments
+            ]
+        else:
+            if not (reusable and 0 <= part_size <= self.size):
+                part_size = 0
+                open(self.part_path, "wb").close()
+                self._save_state()
+            ranges = [(part_size, self.size - part_size)]
+
+        self.remaining = len(ranges)
+        return ranges
+
+    def _save_state(self):
+        with open(f"{self.part_path}.json", "w") as f:
+            json.dump(
+                {
+                    "size": self.size,
+                    "mtime": int(self.mtime),
+                    "segmented": self.segmented,
+                    "segments": sorted(self.done_segments),
+                },
+                f,
+            )
+
+    def range_done(self, offset):
+        """Records a finished range; the last one moves the file into place."""
+        with self.lock:
+            self.remaining -= 1
+            if self.segmented:
+                self.done_segments.add(offset)
+                self._save_state()
+            if self.remaining or self.failed:
+                return
+        os.replace(self.part_path, self.local_path)
+        os.utime(self.local_path, (self.mtime, self.mtime))
+        os.remove(f"{self.part_path}.json")
+        self.completed = True
+
+
+def _fetch_range(pool, transfer, offset, length, progress):
+    sftp = pool.get()
+    with sftp.open(transfer.remote_path, "rb") as remote_file, open(
+        transfer.part_path, "r+b"
+    ) as local_file:
+        remote_file.seek(offset)
+        # Pipelines the read requests for this range instead of one round trip per block
+        remote_file.prefetch(offset + length)
+        local_file.seek(offset)
+        remaining = length
+        while remaining:
+            data = remote_file.read(min(READ_SIZE, remaining))
+            if not data:
+                raise IOError(f"Unexpected end of file while reading {transfer.remote_path}")
+            local_file.write(data)
+            remaining -= len(data)
+            progress.update(len(data))
+    transfer.range_done(offset)
+
+
+def _list_top_level_entry(pool, remote_root, attr):
+    remote_path = posixpath.join(remote_root, attr.filename)
+    if stat.S_ISDIR(attr.st_mode):
+        return list_remote_tree(pool.get(), remote_path)
+    return [], [(remote_path, attr.st_size, attr.st_mtime)]
+
+
+def _local_paths(relatives, local_name, resolved=None):
+    """
+    Maps remote relative paths to local ones by applying local_name to every
+    component, parents first. A name that would be shared by two siblings keeps
+    its remote name. Returns ({relative: local relative}, [paths kept as they are]).
+    """
+    if local_name is None:
+        return {relative: relative for relative in relatives}, []
+    local_paths = dict(resolved or {})
+    siblings = {}
+    for relative in relatives:
+        if relative not in local_paths:
+            siblings.setdefault(posixpath.dirname(relative), []).append(relative)
+
+    collisions = []
+    for parent in sorted(siblings, key=lambda path: path.count("/") if path else -1):
+        local_parent = local_paths.get(parent, parent)
+        names = {posixpath.basename(relative): relative for relative in siblings[parent]}
+        wanted = {}
+        for name in names:
+            wanted.setdefault(local_name(name), []).append(name)
+        for new_name, old_names in wanted.items():
+            if len(old_names) > 1:
+                # Only the names that change give way; one that is already clean keeps it
+                kept = [name for name in old_names if name != new_name]
+                collisions.extend(names[name] for name in kept)
+                chosen = {name: name for name in old_names}
+            else:
+                chosen = {old_names[0]: new_name}
+            for name, local in chosen.items():
+                local_paths[names[name]] = posixpath.join(local_parent, local)
+    return local_paths, sorted(collisions)
+
+
+def _is_unchanged(local_path, size, mtime):
+    try:
+        local = os.stat(local_path)
+    except OSError:
+        return False
+    return local.st_size == size and int(local.st_mtime) == int(mtime)
+
+
+def download_tree(
+    connect,
+    remote_root,
+    download_directory,
+    connections=1,
+    force=False,
+    sync=False,
+    local_name=None,
+):
+    """
+    Downloads every top-level directory of remote_root into download_directory
+    over `connections` SFTP connections.
+
+    Directories that already exist locally are skipped unless `force` is set or
+    a previous run was interrupted inside them. Files are written to `.part`
+    files and resumed from there; files larger than SEGMENT_SIZE are split into
+    segments fetched in parallel. Returns the top-level directories downloaded.
+
+    Every file fetched is recorded with its remote size and mtime in a manifest
+    in download_directory. With `sync`, all directories are listed and only
+    files that are new or changed against the manifest are transferred; files
+    in the manifest that are gone remotely are reported. Returns the top-level
+    directories where something was transferred.
+
+    `local_name`, when given, maps every remote file or directory name to the
+    name written locally (e.g. without white spaces); the returned directories
+    are then the local names.
+    """
+    manifest_path = os.path.join(download_directory, MANIFEST_FILE)
+    manifest = load_manifest(manifest_path)
+    pool = SftpConnectionPool(connect)
+    # A single pool of `connections` threads, each holding its own SFTP connection
+    executor = ThreadPoolExecutor(max_workers=connections)
+    transfers = {}
+    try:
+        top_level = executor.submit(
+            lambda: pool.get().listdir_attr(remote_root)
+        ).result()
+        top_names, collisions = _local_paths(
+            [attr.filename for attr in top_level], local_name
+        )
+        selected = []
+        for attr in top_level:
+            local_dir = os.path.join(download_directory, top_names[attr.filename])
+            interrupted = os.path.isfile(os.path.join(local_dir, IN_PROGRESS_MARKER))
+            if sync:
+                click.echo(f"Syncing `{attr.filename}`.")
+                selected.append(attr)
+            elif force or interrupted or not os.path.isdir(local_dir):
+                click.echo(
+                    f"{'Resuming' if interrupted else 'Downloading'} `{attr.filename}`."
+                )
+                selected.append(attr)
+            else:
+                click.echo(
+                    f"Directory already exists`{attr.filename}`. Skip downloading..."
+                )
+
+        ranges, skipped, remote_files = [], 0, set()
+        listings = {
+            executor.submit(_list_top_level_entry, pool, remote_root, attr): attr.filename
+            for attr in selected
+        }
+        # Everything is listed before local names are given, so collisions are resolved the same way every run
+        listed = {listings[future]: future.result() for future in as_completed(listings)}
+        local_paths, nested_collisions = _local_paths(
+            [
+                posixpath.relpath(path, remote_root)
+                for directories, files in listed.values()
+                for path in directories + [remote_path for remote_path, _, _ in files]
+            ],
+            local_name,
+            resolved=top_names,
+        )
+        collisions += nested_collisions
+        for relative in collisions:
+            click.echo(f"`{relative}` keeps its remote name, its local name is taken.")
+
+        for name, (directories, files) in listed.items():
+            local_top = os.path.join(download_directory, top_names[name])
+            if directories:
+                os.makedirs(local_top, exist_ok=True)
+                open(os.path.join(local_top, IN_PROGRESS_MARKER), "w").close()
+            for directory in directories:
+                relative = posixpath.relpath(directory, remote_root)
+                os.makedirs(
+                    os.path.join(download_directory, local_paths[relative]), exist_ok=True
+                )
+
+            for remote_path, size, mtime in files:
+                relative = posixpath.relpath(remote_path, remote_root)
+                local_path = os.path.join(download_directory, local_paths[relative])
+                remote_files.add(relative)
+                if not force:
+                    # When syncing, the manifest is trusted over the local mtime, which
+                    # the fixers may have changed since; a file deleted locally is fetched again
+                    if (
+                        sync
+                        and manifest.get(relative) == [size, int(mtime)]
+                        and os.path.exists(local_path)
+                    ):
+                        skipped += 1
+                        continue
+                    if _is_unchanged(local_path, size, mtime):
+                        manifest[relative] = [size, int(mtime)]
+                        skipped += 1
+                        continue
+                # A segmented .part from an earlier run is resumed as such, whatever `connections` is
+                segmented = size > SEGMENT_SIZE and (
+                    connections > 1
+                    or _load_part_state(f"{local_path}.part").get("segmented", False)
+                )
+                transfer = _FileTransfer(remote_path, local_path, size, mtime, segmented)
+                transfers.setdefault(name, []).append(transfer)
+                ranges.extend(
+                    (transfer, offset, length) for offset, length in transfer.plan()
+                )
+
+        total_bytes = sum(length for _, _, length in ranges)
+        click.echo(
+            f"{sum(len(t) for t in transfers.values())} files to transfer "
+            f"({total_bytes / 1024 ** 3:.2f} GB), {skipped} already present."
+        )
+
+        failed = {}
+        start = time.monotonic()
+        with tqdm(total=total_bytes, unit="B", unit_scale=True, desc="SFTP") as progress:
+            futures = {
+                executor.submit(_fetch_range, pool, transfer, offset, length, progress): transfer
+                for transfer, offset, length in ranges
+            }
+            for future in as_completed(futures):
+                transfer = futures[future]
+                if future.exception() is not None:
+                    transfer.failed = True
+                    failed[transfer.remote_path] = future.exception()
+        elapsed = time.monotonic() - start
+
+        deleted = []
+        if sync:
+            deleted = sorted(set(manifest) - remote_files)
+            for relative in deleted:
+                del manifest[relative]
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        pool.close()
+        # Completed files are recorded even when the run is interrupted
+        for transfer in (t for name_transfers in transfers.values() for t in name_transfers):
+            if transfer.completed:
+                relative = posixpath.relpath(transfer.remote_path, remote_root)
+                manifest[relative] = [transfer.size, int(transfer.mtime)]
+        save_manifest(manifest_path, manifest)
+
+    click.echo(
+        f"Transferred {progress.n / 1024 ** 3:.2f} GB in {elapsed:.1f}s "
+        f"({progress.n / 1024 ** 2 / max(elapsed, 1e-9):.1f} MB/s over {connections} connections)."
+    )
+    for remote_path, error in sorted(failed.items()):
+        click.echo(f"Failed to download `{remote_path}`: {error}")
+    if deleted:
+        click.echo(f"{len(deleted)} files were deleted remotely (kept locally):")
+        for relative in deleted:
+            click.echo(f"  - {relative}")
+
+    downloaded_directories = []
+    for attr in selected:
+        local_top = os.path.join(download_directory, top_names[attr.filename])
+        if any(t.failed for t in transfers.get(attr.filename, [])):
+            click.echo(f"`{attr.filename}` is incomplete; run again to resume it.")
+            continue
+        marker = os.path.join(local_top, IN_PROGRESS_MARKER)
+        if os.path.isfile(marker):
+            os.remove(marker)
+        if sync and not transfers.get(attr.filename):
+            continue
+        downloaded_directories.append(top_names[attr.filename])
+    return downloaded_directories
@@ -2,18 +2,17 @@ import click
 import logging
 import os
 import pysftp
-import re
 import shutil
 import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from .sftp_download import download_tree
 
 URL = "https://digitization.web.cern.ch"
 
 main_directory = (
     "/eos/project-p/psdigitization/public/CERN-Project-Files/CERN-Project-Files/www"
 )
-ERROR = []
-MISSING_XMLS = []
-REGEXP = r"(?!original)([\w\W]+)\.(xml)"
 MAX_NUMBER_OF_RECORDS_COLLECT = 500
 
 
@@ -26,67 +25,207 @@ def file_list_chunker(files, chunk_size=MAX_NUMBER_OF_RECORDS_COLLECT):
         yield files[i : i + chunk_size]
 
 
-def records_collection_creation(input_dir, output_dir):
+def is_record_xml(name):
+    r"""Same names as re.match(r"(?!original)([\w\W]+)\.(xml)", name), without running the regex per file."""
+    return not name.startswith("original") and ".xml" in name[1:]
+
+
+def iter_record_xmls(directory):
+    """
+    Yields record XML paths in the order os.walk(directory, topdown=False) lists
+    them: subdirectories first, then the directory's own files, each in scandir order.
+    """
+    # (path, None) is still to be scanned; (path, files) has had its subdirectories yielded
+    stack = [(directory, None)]
+    while stack:
+        path, record_files = stack.pop()
+        if record_files is not None:
+            yield from record_files
+            continue
+        try:
+            entries = list(os.scandir(path))
+        except OSError:
+            continue
+        subdirectories, record_files = [], []
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if is_dir:
+                # os.walk lists symlinked directories but does not descend into them
+                if not entry.is_symlink():
+                    subdirectories.append(entry.path)
+            elif is_record_xml(entry.name):
+                record_files.append(entry.path)
+        stack.append((path, record_files))
+        stack.extend((subdirectory, None) for subdirectory in reversed(subdirectories))
+
+
+COLLECTION_TAGS = ("<collection>", "</collection>")
+READ_CHUNK_SIZE = 64 * 1024
+
+
+class _StreamingRemover:
+    """Removes every occurrence of `pattern` from text fed in chunks, like str.replace(pattern, "")."""
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.carry = ""
+
+    def feed(self, chunk):
+        buffer = self.carry + chunk
+        parts, start = [], 0
+        while True:
+            index = buffer.find(self.pattern, start)
+            if index == -1:
+                break
+            parts.append(buffer[start:index])
+            start = index + len(self.pattern)
+        # Keep a tail that could still be the beginning of a pattern split across chunks
+        keep = min(len(self.pattern) - 1, len(buffer) - start)
+        parts.append(buffer[start : len(buffer) - keep])
+        self.carry = buffer[len(buffer) - keep :]
+        return "".join(parts)
+
+    def flush(self):
+        tail, self.carry = self.carry, ""
+        return tail
+
+
+def _copy_without_collection_tags(file_path, nf):
+    with open(file_path, "r") as f:
+        if os.fstat(f.fileno()).st_size <= READ_CHUNK_SIZE:
+            # The usual case: the record fits in one buffer and is read before anything is written
+            nf.write(f.read().replace("<collection>", "").replace("</collection>", ""))
+            return
+
+        position = nf.tell()
+        try:
+            # Chained like data.replace("<collection>", "").replace("</collection>", "")
+            removers = [_StreamingRemover(tag) for tag in COLLECTION_TAGS]
+            while True:
+                chunk = f.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                for remover in removers:
+                    chunk = remover.feed(chunk)
+                nf.write(chunk)
+            tail = ""
+            for remover in removers:
+                tail = remover.feed(tail) + remover.flush()
+            nf.write(tail)
+        except Exception:
+            # Like a failed read before, the record is left out: drop what was streamed of it
+            nf.seek(position)
+            nf.truncate()
+            raise
+
+
+def _write_collection_file(filename, chunk):
+    with open(filename, "w") as nf:
+        nf.write("<collection>")
+        for file_path in chunk:
+            logging.info(f"Processing {file_path}")
+            try:
+                _copy_without_collection_tags(file_path, nf)
+            except Exception as e:
+                logging.error(f"Error while reading file {file_path}: {e}")
+                continue
+
+        nf.write("</collection>")
+    logging.info(f"Collection {filename} written successfully.")
+
+
+def records_collection_creation(input_dir, output_dir, workers=8):
     logging.info(f"Creating collection file for {input_dir}")
-    file_list = [
-        os.path.join(root, _file)
-        for root, _, files in os.walk(input_dir, topdown=False)
-        for _file in files
-        if re.match(REGEXP, _file)
-    ]
+    file_list = list(iter_record_xmls(input_dir))
 
     logging.info(
         f"All files to be combined found: {len(file_list)}. Will generate {len(file_list) // MAX_NUMBER_OF_RECORDS_COLLECT} collection files."
     )
 
-    chunks = list(file_list_chunker(file_list))
-
     os.makedirs(output_dir, exist_ok=True)
 
-    for collection_file_name, chunk in enumerate(chunks, start=1):
-        filename = f"{output_dir}/{collection_file_name}.xml"
-
-        with open(filename, "w") as nf:
-            nf.write("<collection>")
-            for file_path in chunk:
-                logging.info(f"Processing {file_path}")
-                try:
-                    with open(file_path, "r") as f:
-                        data = f.read()
-                except Exception as e:
-                    logging.error(f"Error while reading file {file_path}: {e}")
-                    continue
-                try:
-                    data = data.replace("<collection>", "").replace("</collection>", "")
-                    nf.write(data)
-                except Exception as e:
-                    logging.error(f"Error while writing file {file_path}: {e}")
-                    continue
-
-            nf.write("</collection>")
-
-    logging.info(f"Collection {collection_file_name} written successfully.")
-
-
-def fix_white_spaces_in_directory(start_dir):
-    for root, dirs, files in os.walk(start_dir, topdown=False):
-        for directory in dirs:
-            if " " in directory:
-                new_directory = directory.replace(" ", "_")
-                os.rename(
-                    os.path.join(root, directory), os.path.join(root, new_directory)
-                )
-                print(f"Renamed directory: {directory} -> {new_directory}")
-        for filename in files:
-            if " " in filename:
-                new_filename = filename.replace(" ", "_")
-                os.rename(
-                    os.path.join(root, filename), os.path.join(root, new_filename)
-                )
-                print(f"Renamed file: {filename} -> {new_filename}")
-
-
-def download_files_from_ftp(force=False):
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(
+                _write_collection_file, f"{output_dir}/{collection_file_name}.xml", chunk
+            )
+            for collection_file_name, chunk in enumerate(
+                file_list_chunker(file_list), start=1
+            )
+        ]
+        for future in futures:
+            future.result()
+
+
+def sanitize_white_spaces(name):
+    return name.replace(" ", "_")
+
+
+def plan_white_space_renames(start_dir):
+    """
+    Scans start_dir once and returns (renames, collisions).
+
+    renames is a list of (depth, parent, old_name, new_name) for every entry
+    with a white space; collisions lists the paths left alone because their new
+    name is already taken by a sibling or wanted by another one.
+    """
+    renames, collisions = [], []
+    stack = [(start_dir, 0)]
+    while stack:
+        parent, depth = stack.pop()
+        try:
+            entries = list(os.scandir(parent))
+        except OSError:
+            continue
+        names = {entry.name for entry in entries}
+        wanted = {}
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                stack.append((entry.path, depth + 1))
+            if " " in entry.name:
+                wanted.setdefault(sanitize_white_spaces(entry.name), []).append(entry.name)
+        for new_name, old_names in wanted.items():
+            if new_name in names or len(old_names) > 1:
+                collisions.extend(os.path.join(parent, name) for name in old_names)
+            else:
+                renames.append((depth, parent, old_names[0], new_name))
+    return renames, collisions
+
+
+def apply_renames(renames, workers=8):
+    """
+    Applies a plan from plan_white_space_renames, deepest level first so the
+    parents of each batch still have their old names; each level runs in parallel.
+    """
+    by_depth = {}
+    for depth, parent, old_name, new_name in renames:
+        by_depth.setdefault(depth, []).append(
+            (os.path.join(parent, old_name), os.path.join(parent, new_name))
+        )
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for depth in sorted(by_depth, reverse=True):
+            list(executor.map(lambda paths: os.rename(*paths), by_depth[depth]))
+
+
+def fix_white_spaces_in_directory(start_dir, dry_run=False, workers=8):
+    renames, collisions = plan_white_space_renames(start_dir)
+    for path in sorted(collisions):
+        click.echo(f"Not renamed, the name without white spaces is taken: {path}")
+    if dry_run:
+        for _, parent, old_name, new_name in sorted(renames):
+            click.echo(f"Would rename: {os.path.join(parent, old_name)} -> {new_name}")
+        click.echo(f"{len(renames)} renames planned, {len(collisions)} collisions.")
+        return renames, collisions
+
+    apply_renames(renames, workers=workers)
+    click.echo(f"Renamed {len(renames)} entries, {len(collisions)} collisions left as they are.")
+    return renames, collisions
+
+
+def download_files_from_ftp(force=False, connections=1, sync=False, fix_white_spaces=False):
     host = os.getenv("FTP_HOST")
     username = os.getenv("FTP_USERNAME")
     password = os.getenv("FTP_PASSWORD")
@@ -96,85 +235,130 @@ def download_files_from_ftp(force=False):
 
     cnopts = pysftp.CnOpts()
     cnopts.hostkeys = None
-    downloaded_directories = []
-    with pysftp.Connection(
-        host=host, username=username, password=password, cnopts=cnopts
-    ) as sftp:
-        sftp.cwd(main_directory)
-        directory_structure = sftp.listdir_attr()
-        for attr in directory_structure:
-            if force or not os.path.isdir(
-                os.path.join(download_directory, attr.filename)
-            ):
-                click.echo(f"Downloading `{attr.filename}`.")
-                remoteFilePath = attr.filename
-                localFilePath = download_directory
-                sftp.get_r(remoteFilePath, localFilePath, preserve_mtime=True)
-                downloaded_directories.append(attr.filename)
-            else:
-                click.echo(
-                    f"Directory already exists`{attr.filename}`. Skip downloading..."
-                )
-    return downloaded_directories
+
+    def connect():
+        return pysftp.Connection(
+            host=host, username=username, password=password, cnopts=cnopts
+        )
+
+    return download_tree(
+        connect,
+        main_directory,
+        download_directory,
+        connections=connections,
+        force=force,
+        sync=sync,
+        local_name=sanitize_white_spaces if fix_white_spaces else None,
+    )
+
+
+PLACEHOLDERS = ("[PATH]", "[EOS_PATH]")
+
+
+def _save_original(xml_path, xml_path_original):
+    """Keeps the untouched XML next to it; a hard link where the filesystem allows one."""
+    try:
+        os.link(xml_path, xml_path_original)
+    except OSError:
+        shutil.copy2(xml_path, xml_path_original)
+
+
+def _is_already_fixed(xml_path, pdf_url, tif_url):
+    """True when no placeholder is left and the rewritten URL fields point at the current files."""
+    xml_root = ET.parse(xml_path).getroot()
+    for x in xml_root.findall(".//datafield"):
+        tag = x.attrib.get("tag")
+        if tag == "FFT":
+            subfield = x.find('.//subfield[@code="a"]')
+            text = subfield.text if subfield is not None else None
+            if text is None:
+                continue
+            if text.startswith(PLACEHOLDERS):
+                return False
+            if text.startswith(URL) and text != pdf_url:
+                return False
+        elif tag == "856":
+            subfield = x.find('.//subfield[@code="u"]')
+            text = subfield.text if subfield is not None else None
+            if text and text.startswith(URL) and text != tif_url:
+                return False
+    return True
 
 
 def fix_xml(root, xml_path, tif_path, pdf_path):
+    """
+    Rewrites the [PATH] / [EOS_PATH] placeholders of a record XML into public URLs.
+    Returns "fixed", "skipped" (already rewritten for these files) or "missing".
+
+    The placeholders are always read from original_<name>.xml, so running it
+    again is idempotent; the rewritten XML replaces the old one atomically and
+    never shares an inode with the original.
+    """
     xml_file_name = os.path.basename(xml_path)
     xml_file_name_original = "original_{}".format(xml_file_name)
     xml_path_original = os.path.join(root, xml_file_name_original)
 
-    if os.path.isfile(xml_path):
-        if os.path.isfile(xml_path_original):
-            click.echo("We have original")
-            os.remove(xml_path)
-            shutil.copy2(
-                os.path.join(root, "original_{}".format(xml_file_name)), xml_path
-            )
-        else:
-            click.echo("Saving the original file")
-            shutil.copy2(
-                xml_path, os.path.join(root, "original_{}".format(xml_file_name))
-            )
-    else:
-        click.echo("XML files are missing completely!")
-        MISSING_XMLS.append(xml_path)
+    if not os.path.isfile(xml_path):
+        return "missing"
 
     pdf_url = url_from_eos_path(pdf_path)
     tif_url = url_from_eos_path(tif_path)
 
+    if os.path.isfile(xml_path_original):
+        if _is_already_fixed(xml_path, pdf_url, tif_url):
+            return "skipped"
+    else:
+        _save_original(xml_path, xml_path_original)
+
+    tree = ET.parse(xml_path_original)
+    xml_root = tree.getroot()
+    for x in xml_root.findall('.//datafield[@tag="FFT"]'):
+        if x.find('.//subfield[@code="a"]').text.startswith("[PATH]"):
+            x.find('.//subfield[@code="a"]').text = pdf_url
+
+        elif x.find('.//subfield[@code="a"]').text.startswith("[EOS_PATH]"):
+            x.attrib["tag"] = "856"
+            x.attrib["ind1"] = "4"
+            for child in list(x):
+                if child.attrib["code"] == "d":
+                    x.remove(child)
+                if child.attrib["code"] == "a":
+                    child.attrib["code"] = "u"
+                    child.text = tif_url
+                if child.attrib["code"] == "t":
+                    child.attrib["code"] = "q"
+                    child.text = "TIFF"
+
+    tmp_path = os.path.join(root, f".{xml_file_name}.tmp")
     try:
-        tree = ET.parse(xml_path)
-        xml_root = tree.getroot()
-        for x in xml_root.findall('.//datafield[@tag="FFT"]'):
-            if x.find('.//subfield[@code="a"]').text.startswith("[PATH]"):
-                x.find('.//subfield[@code="a"]').text = pdf_url
-
-            elif x.find('.//subfield[@code="a"]').text.startswith("[EOS_PATH]"):
-                x.attrib["tag"] = "856"
-                x.attrib["ind1"] = "4"
-                for child in x.getchildren():
-                    if child.attrib["code"] == "d":
-                        x.remove(child)
-                    if child.attrib["code"] == "a":
-                        child.attrib["code"] = "u"
-                        child.text = tif_url
-                    if child.attrib["code"] == "t":
-                        child.attrib["code"] = "q"
-                        child.text = "TIFF"
-        tree.write(xml_path, encoding="utf-8")
-    except Exception:
-        ERROR.append(xml_path)
-
-
-def find_all_xmls():
-    os.chdir(main_directory)
-    for root, dirs, files in os.walk(main_directory, topdown=False):
+        tree.write(tmp_path, encoding="utf-8")
+        shutil.copymode(xml_path_original, tmp_path)
+        os.replace(tmp_path, xml_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return "fixed"
+
+
+def _fix_xmls_in_tree(start_dir, recursive=True):
+    """Fixes every record under start_dir; returns the counts and the missing/errored paths."""
+    summary = {"fixed": 0, "skipped": 0, "missing": [], "errors": []}
+    if recursive:
+        walk = os.walk(start_dir, topdown=False)
+    else:
+        walk = [next(os.walk(start_dir))]
+
+    for root, dirs, files in walk:
         try:
             xml_path = os.path.join(
                 root,
                 next(
                     filter(
-                        lambda x: not x.startswith("original_") and x.endswith(".xml"),
+                        # test.xml is a leftover removed below, never the record
+                        lambda x: not x.startswith("original_")
+                        and x.endswith(".xml")
+                        and x != "test.xml",
                         files,
                     )
                 ),
@@ -187,10 +371,49 @@ def find_all_xmls():
             )
         except StopIteration:
             continue
-        fix_xml(root, xml_path, tif_path, pdf_path)
-        click.echo(xml_path)
+        try:
+            status = fix_xml(root, xml_path, tif_path, pdf_path)
+        except Exception as e:
+            summary["errors"].append(f"{xml_path}: {e}")
+            continue
+        if status == "missing":
+            summary["missing"].append(xml_path)
+        else:
+            summary[status] += 1
+            if status == "fixed":
+                click.echo(xml_path)
 
         test_file = os.path.join(root, "test.xml")
         if os.path.isfile(test_file):
             os.remove(test_file)
             click.echo(test_file)
+    return summary
+
+
+def find_all_xmls(workers=None):
+    """
+    Fixes the EOS paths of every record under main_directory, one process per
+    top-level directory, and prints a summary.
+    """
+    top_level_dirs = sorted(
+        entry.path for entry in os.scandir(main_directory) if entry.is_dir()
+    )
+    # The top directory's own files are not part of any partition
+    summary = _fix_xmls_in_tree(main_directory, recursive=False)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for partial in executor.map(_fix_xmls_in_tree, top_level_dirs):
+            summary["fixed"] += partial["fixed"]
+            summary["skipped"] += partial["skipped"]
+            summary["missing"].extend(partial["missing"])
+            summary["errors"].extend(partial["errors"])
+
+    click.echo(
+        f"EOS paths: {summary['fixed']} fixed, {summary['skipped']} already fixed, "
+        f"{len(summary['missing'])} missing XML, {len(summary['errors'])} errors."
+    )
+    for xml_path in summary["missing"]:
+        click.echo(f"  Missing XML: {xml_path}")
+    for error in summary["errors"]:
+        click.echo(f"  Error: {error}")
+    return summary
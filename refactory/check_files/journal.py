@@ -0,0 +1,49 @@
+import json
+import os
+
+
+class ValidationJournal:
+    """
+    Append-only JSONL record of every verdict of a validation run, one line per
+    file, flushed as it is written so an interrupted run can be resumed.
+    """
+
+    def __init__(self, path: str, resume: bool = False):
+        self.path = path
+        self.entries: dict[str, dict] = {}
+        if resume and os.path.exists(path):
+            self._truncate_partial_line()
+            self.entries = self.load(path)
+        self._file = open(path, "a" if resume else "w", encoding="utf-8")
+
+    def _truncate_partial_line(self) -> None:
+        # A run killed mid-write can leave half a line; drop it so appends stay parseable
+        with open(self.path, "rb+") as f:
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                f.truncate(data.rfind(b"\n") + 1)
+
+    @staticmethod
+    def load(path: str) -> dict[str, dict]:
+        """Returns {key: entry} for every complete line; a later line for a key wins."""
+        entries = {}
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                entries[entry["key"]] = entry
+        return entries
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.entries
+
+    def record(self, key: str, is_valid: bool, cached: bool = False) -> None:
+        entry = {"key": key, "valid": is_valid, "cached": cached}
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self.entries[key] = entry
+
+    def close(self) -> None:
+        self._file.close()
@@ -3,8 +3,217 @@ import re
 import os
 import sys
 import json
+import queue
+import threading
+import time
+from collections.abc import Iterable, Iterator
+from concurrent.futures import (
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
 from refactory.storage_connection import StorageProvider, S3Provider, CernboxProvider
-from .utils import validate_pdf
+from refactory.metrics import Metrics
+from .utils import PDF_TRAILER_SIZE, precheck_pdf, validate_pdf
+from .verdict_cache import ValidationVerdictCache
+from .journal import ValidationJournal
+
+
+def passes_range_precheck(provider: StorageProvider, pdf_path: str) -> bool:
+    """Checks the PDF header and trailer with two ranged reads, without downloading the body."""
+    header = provider.read_range(pdf_path, 0, 7)
+    trailer = provider.read_range(pdf_path, -PDF_TRAILER_SIZE)
+    return precheck_pdf(header, trailer)
+
+
+def _download_for_validation(
+    provider: StorageProvider,
+    pdf_path: str,
+    range_precheck: bool = False,
+    memory_limit: int = 0,
+    metrics: Metrics = None,
+    size: int = None,
+) -> bytes | str | None:
+    """
+    Returns the file contents when they fit in `memory_limit` bytes, otherwise the
+    path of a new temp file holding them, or the file's own path when the provider
+    can read it in place. None if the ranged precheck already rejects it.
+    A file whose listed `size` is over the limit goes straight to the temp file.
+    """
+    metrics = metrics if metrics is not None else Metrics("validation")
+    if range_precheck:
+        with metrics.span("range_precheck"):
+            if not passes_range_precheck(provider, pdf_path):
+                return None
+    local_path = provider.local_path(pdf_path)
+    if local_path is not None:
+        return local_path
+    with metrics.span("download"):
+        if memory_limit > 0 and (size is None or size <= memory_limit):
+            data = provider.download_to_buffer(pdf_path, memory_limit)
+            if data is not None:
+                return data
+        fd, tmp_path = tempfile.mkstemp(suffix=".pdf")
+        os.close(fd)
+        try:
+            provider.download_to_temp(pdf_path, tmp_path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+    return tmp_path
+
+
+def _is_temp_download(provider: StorageProvider, pdf_path: str, downloaded) -> bool:
+    # Only temp files are removed, never a file validated in place
+    return isinstance(downloaded, str) and downloaded != provider.local_path(pdf_path)
+
+
+def _timed_validate(source) -> tuple[bool, float]:
+    """`validate_pdf` with its duration, measured in the worker process."""
+    start = time.perf_counter()
+    is_valid = validate_pdf(source)
+    return is_valid, time.perf_counter() - start
+
+
+def iter_validated_files(
+    provider: StorageProvider,
+    pdf_paths: Iterable[str],
+    download_workers: int = 1,
+    validate_workers: int = 1,
+    range_precheck: bool = False,
+    memory_limit: int = 0,
+    metrics: Metrics = None,
+    sizes: dict[str, int] = None,
+) -> Iterator[tuple[str, bool]]:
+    """
+    Downloads and validates each file, yielding (path, is_valid) as results complete.
+
+    With more than one worker, a thread pool of downloaders feeds a process pool
+    of `validate_pdf` workers, so downloads overlap with parsing. The number of
+    downloaded-but-unvalidated files is bounded.
+
+    With `range_precheck`, truncated or non-PDF objects are rejected from a
+    ranged read of their header and trailer, and only the rest are downloaded.
+
+    Files up to `memory_limit` bytes are validated from memory instead of a temp
+    file; larger ones, or all of them when it is 0, still go through local disk.
+    `sizes` holds the listed size of each path where known, so files over the
+    limit are not first requested into memory.
+    Files the provider exposes through `local_path` are validated in place.
+
+    The time spent in range prechecks, downloads and `validate_pdf` is recorded
+    in `metrics` as the "range_precheck", "download" and "pdf_validation" stages.
+    """
+    metrics = metrics if metrics is not None else Metrics("validation")
+    sizes = sizes if sizes is not None else {}
+    if download_workers <= 1 and validate_workers <= 1:
+        for pdf_path in pdf_paths:
+            downloaded = _download_for_validation(
+                provider,
+                pdf_path,
+                range_precheck,
+                memory_limit,
+                metrics,
+                sizes.get(pdf_path),
+            )
+            if downloaded is None:
+                yield pdf_path, False
+                continue
+            try:
+                with metrics.span("pdf_validation"):
+                    is_valid = validate_pdf(downloaded)
+            finally:
+                if _is_temp_download(provider, pdf_path, downloaded):
+                    os.remove(downloaded)
+            yield pdf_path, is_valid
+        return
+
+    results: queue.Queue = queue.Queue()
+    in_flight = threading.BoundedSemaphore(download_workers + 2 * validate_workers)
+    validators: Executor = (
+        ProcessPoolExecutor(max_workers=validate_workers)
+        if validate_workers > 1
+        else ThreadPoolExecutor(max_workers=1)
+    )
+
+    def fail(pdf_path, error):
+        failed = Future()
+        failed.set_exception(error)
+        results.put((pdf_path, failed))
+
+    # Callbacks run on pool threads, where an exception would be lost and leave
+    # the drain loop below waiting forever: every path ends in `results`
+    def on_validated(pdf_path, downloaded, future):
+        try:
+            try:
+                if _is_temp_download(provider, pdf_path, downloaded):
+                    os.remove(downloaded)
+            finally:
+                in_flight.release()
+            if future.exception() is None:
+                is_valid, seconds = future.result()
+                metrics.observe("stage", "pdf_validation", seconds)
+                future = Future()
+                future.set_result(is_valid)
+            results.put((pdf_path, future))
+        except BaseException as e:
+            fail(pdf_path, e)
+
+    def on_downloaded(pdf_path, future):
+        if future.exception() is not None:
+            in_flight.release()
+            results.put((pdf_path, future))
+            return
+        downloaded = future.result()
+        if downloaded is None:
+            in_flight.release()
+            rejected = Future()
+            rejected.set_result(False)
+            results.put((pdf_path, rejected))
+            return
+        try:
+            validation = validators.submit(_timed_validate, downloaded)
+        except BaseException as e:
+            # e.g. BrokenProcessPool: the file is never validated, so it is released here
+            try:
+                if _is_temp_download(provider, pdf_path, downloaded):
+                    os.remove(downloaded)
+            except OSError:
+                pass
+            in_flight.release()
+            fail(pdf_path, e)
+            return
+        validation.add_done_callback(
+            lambda validated: on_validated(pdf_path, downloaded, validated)
+        )
+
+    submitted = completed = 0
+    # Downloaders shut down first, so no validation is submitted after the validators stop
+    with validators, ThreadPoolExecutor(max_workers=download_workers) as downloaders:
+        for pdf_path in pdf_paths:
+            in_flight.acquire()
+            downloaders.submit(
+                _download_for_validation,
+                provider,
+                pdf_path,
+                range_precheck,
+                memory_limit,
+                metrics,
+                sizes.get(pdf_path),
+            ).add_done_callback(
+                lambda downloaded, pdf_path=pdf_path: on_downloaded(pdf_path, downloaded)
+            )
+            submitted += 1
+            while not results.empty():
+                pdf_path_done, future = results.get()
+                completed += 1
+                yield pdf_path_done, future.result()
+
+        while completed < submitted:
+            pdf_path_done, future = results.get()
+            completed += 1
+            yield pdf_path_done, future.result()
 
 
 def run_validation_pipeline(
@@ -13,16 +222,36 @@ def run_validation_pipeline(
     log_file: str,
     data_source: str | list[int],
     upload_reports: bool = False,
-
+    download_workers: int = 1,
+    validate_workers: int = 1,
+    range_precheck: bool = False,
+    memory_limit: int = 0,
+    verdict_cache: ValidationVerdictCache = None,
+    resume: bool = False,
+    metrics: Metrics = None,
 ):
-    """Navigates directories, validates files, and logs files status."""
+    """
+    Navigates directories, validates files, and logs files status.
+    With a `verdict_cache`, objects whose key, ETag and size were already
+    validated reuse the stored verdict and are neither downloaded nor parsed.
+
+    Every verdict is appended to a journal next to `log_file` as it is
+    produced, and the reports are built from it. With `resume`, files already
+    in the journal of an interrupted run are skipped.
+
+    Stage timings (data source, folder listing, validation, reports) are
+    recorded in `metrics`.
+    """
+    metrics = metrics if metrics is not None else Metrics("validate-files-integrity")
     target_box_numbers = set()
     if isinstance(data_source, str):
         data_source_provider = CernboxProvider(data_source)
-        excel_files = data_source_provider.list_files("", '.xlsx')
+        with metrics.span("data_source"):
+            # Only the inventories at the root of the share, not those in subfolders
+            excel_files = data_source_provider.list_folder_files("", '.xlsx')
 
         for file_path in excel_files:
-            filename = file_path.split(".")[0]
+            filename = os.path.basename(file_path).split(".")[0]
 
             match = re.search(r"(?i:BOITE)[\-_]O0(\d+)(-\w+)?", filename)
 
@@ -34,18 +263,26 @@ def run_validation_pipeline(
     print(f"Excel files: {len(target_box_numbers)} boxes to check.")
 
     print(f"Folders in: {base_path}")
-    folders = provider.list_folders(base_path)
+    with metrics.span("list_folders"):
+        folders = provider.list_folders(base_path)
 
     if not folders:
         print("No folders found in this path.")
         return
 
     found_and_valid_boxes = set()
-    corrupted_files = []
-    valid_files = []
+    listed_files = set()
+    listed_sizes = {}
+    pending_entries = {}
+
+    journal_path = log_file.replace(".log", ".journal.jsonl")
+    journal = ValidationJournal(journal_path, resume=resume)
+    if resume:
+        print(f"Resuming: {len(journal.entries)} files already in {journal_path}")
 
     print("Starting validation...")
 
+    target_folders = {}
     for folder in folders:
         match = re.search(r"(?i:BOITE)[\-_]O0(\d+)(-\w+)?", folder)
         if not match:
@@ -54,26 +291,70 @@ def run_validation_pipeline(
         box_num = int(match.group(1))
         if box_num not in target_box_numbers:
             continue
-        print(f"Processing target Box: {match.group(1) + (match.group(2) or '')}")
+        target_folders[folder] = match
 
-        pdf_files = provider.list_files(folder, 'PDF')
+    def record_verdict(pdf_path, is_valid, cached=False):
+        marker = " (cached)" if cached else ""
+        if is_valid:
+            print(f"  ✅ {pdf_path}{marker}")
+        else:
+            print(f"  ❌ CORRUPTED: {pdf_path}{marker}")
+        journal.record(pdf_path, is_valid, cached)
 
-        if not pdf_files:
-            print(f"⚠️ EMPTY FOLDER: {folder}")
-            continue
+    def iter_target_pdfs():
+        # Box folders are listed concurrently and validated as each listing completes
+        for folder, pdf_entries in provider.list_file_entries_many(list(target_folders), 'PDF'):
+            match = target_folders[folder]
+            box_num = int(match.group(1))
+            print(f"Processing target Box: {match.group(1) + (match.group(2) or '')}")
 
-        found_and_valid_boxes.add(box_num)
+            if not pdf_entries:
+                print(f"⚠️ EMPTY FOLDER: {folder}")
+                continue
 
-        for pdf_path in pdf_files:
-            with tempfile.NamedTemporaryFile(delete=True) as tmp:
-                provider.download_to_temp(pdf_path, tmp.name)
+            found_and_valid_boxes.add(box_num)
+            for entry in pdf_entries:
+                pdf_path = entry["key"]
+                listed_files.add(pdf_path)
+                if pdf_path in journal:
+                    continue
+                if entry.get("size") is not None:
+                    listed_sizes[pdf_path] = entry["size"]
+                if verdict_cache is not None:
+                    etag, size = entry.get("etag"), entry.get("size")
+                    cached_verdict = verdict_cache.get(pdf_path, etag, size)
+                    if cached_verdict is not None:
+                        record_verdict(pdf_path, cached_verdict, cached=True)
+                        continue
+                    pending_entries[pdf_path] = (etag, size)
+                yield pdf_path
 
-                if validate_pdf(tmp.name):
-                    valid_files.append(pdf_path)
-                    print(f"  ✅ {pdf_path}")
-                else:
-                    print(f"  ❌ CORRUPTED: {pdf_path}")
-                    corrupted_files.append(pdf_path)
+    try:
+        with metrics.span("validation"):
+            for pdf_path, is_valid in iter_validated_files(
+                provider,
+                iter_target_pdfs(),
+                download_workers,
+                validate_workers,
+                range_precheck,
+                memory_limit,
+                metrics,
+                listed_sizes,
+            ):
+                record_verdict(pdf_path, is_valid)
+                if verdict_cache is not None:
+                    verdict_cache.put(pdf_path, *pending_entries.pop(pdf_path), is_valid)
+    finally:
+        journal.close()
+
+    # Only files still listed under the target boxes make it into the reports
+    journaled = ValidationJournal.load(journal_path)
+    valid_files, corrupted_files, cached_files = [], [], set()
+    for pdf_path in sorted(listed_files & journaled.keys()):
+        entry = journaled[pdf_path]
+        (valid_files if entry["valid"] else corrupted_files).append(pdf_path)
+        if entry["cached"]:
+            cached_files.add(pdf_path)
     missing_boxes = target_box_numbers - found_and_valid_boxes
 
     if missing_boxes:
@@ -87,10 +368,12 @@ def run_validation_pipeline(
         log.write(
             f"Validation report for the following boxes {target_box_numbers}\n ✅ Valid Files: {len(valid_files)}\n ❌ Corrupted Files: {len(corrupted_files)}\n"
         )
+        if verdict_cache is not None:
+            log.write(f" ♻️ Cached Verdicts: {len(cached_files)}\n")
         for vf in valid_files:
-            log.write(f"✅ Valid PDF: {vf}\n")
+            log.write(f"✅ Valid PDF: {vf}{' (cached)' if vf in cached_files else ''}\n")
         for cf in corrupted_files:
-            log.write(f"❌ Corrupted PDF: {cf}\n")
+            log.write(f"❌ Corrupted PDF: {cf}{' (cached)' if cf in cached_files else ''}\n")
 
     json_report = {
         "metadata": {"base_path": base_path, "target_boxes": list(target_box_numbers)},
@@ -106,6 +389,10 @@ def run_validation_pipeline(
         },
     }
 
+    if verdict_cache is not None:
+        json_report["statistics"]["cached_files_count"] = len(cached_files)
+        json_report["output"]["cached_files"] = sorted(cached_files)
+
     json_file_path = log_file.replace(".log", ".json")
     with open(json_file_path, "w", encoding="utf-8") as jf:
         json.dump(json_report, jf, indent=4)
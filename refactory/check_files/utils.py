@@ -1,25 +1,62 @@
+import io
 import os
+from typing import BinaryIO
 from pypdf import PdfReader
 from pypdf.errors import PdfReadError
 
-def validate_pdf(file_path: str) -> bool:
-    """Checks if a local PDF is structurally valid and readable."""
+PDF_TRAILER_SIZE = 1024
+
+
+def precheck_pdf(header: bytes, trailer: bytes) -> bool:
+    """
+    Cheap structural check from the first 8 bytes and the last (up to) 1 KB of a file.
+    A trailer shorter than 100 bytes means the whole file is shorter than that.
+    """
+    if len(trailer) < 100:
+        return False
+    return header.startswith(b"%PDF-") and b"%%EOF" in trailer
+
+
+def _read_header_and_trailer(source) -> tuple[int, bytes, bytes]:
+    """Returns (size, first 8 bytes, last 1 KB) of a path, bytes-like or seekable file object."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        view = memoryview(source)
+        size = view.nbytes
+        return size, bytes(view[:8]), bytes(view[-min(PDF_TRAILER_SIZE, size):]) if size else b""
+
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            return _read_header_and_trailer(f)
+
+    size = source.seek(0, os.SEEK_END)
+    source.seek(0)
+    header = source.read(8)
+    source.seek(-min(PDF_TRAILER_SIZE, size), os.SEEK_END)
+    trailer = source.read()
+    source.seek(0)
+    return size, header, trailer
+
+
+def validate_pdf(source: str | bytes | memoryview | BinaryIO) -> bool:
+    """
+    Checks if a PDF is structurally valid and readable. `source` is a local
+    path, the file contents in memory, or a seekable binary file object.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        description = f"in memory ({len(source)} bytes)"
+    else:
+        description = getattr(source, "name", source)
     try:
-        file_size = os.path.getsize(file_path)
+        file_size, header, trailer = _read_header_and_trailer(source)
         if file_size < 100:
             return False
 
-        with open(file_path, "rb") as f:
-            header = f.read(8)
-            f.seek(-min(1024, file_size), 2)
-            trailer = f.read()
-
-        if not header.startswith(b"%PDF-"):
-            return False
-        if b"%%EOF" not in trailer:
+        if not precheck_pdf(header, trailer):
             return False
 
-        reader = PdfReader(file_path)
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            source = io.BytesIO(source)
+        reader = PdfReader(source)
         if len(reader.pages) == 0:
             return False
 
@@ -28,7 +65,7 @@ def validate_pdf(file_path: str) -> bool:
         return True
 
     except OSError as e:
-        raise RuntimeError(f"System error when accessing file {file_path}: {e}") from e
+        raise RuntimeError(f"System error when accessing file {description}: {e}") from e
 
     except (PdfReadError, Exception):
         return False
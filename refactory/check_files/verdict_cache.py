@@ -0,0 +1,54 @@
+import sqlite3
+import threading
+import time
+
+
+class ValidationVerdictCache:
+    """Persistent SQLite store of PDF validation verdicts, keyed by S3 key, ETag and size."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS verdicts (
+                key TEXT PRIMARY KEY,
+                etag TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                is_valid INTEGER NOT NULL,
+                validated_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, key: str, etag: str | None, size: int | None) -> bool | None:
+        """Returns the stored verdict, or None when the object is new, modified or has no ETag."""
+        if etag is None or size is None:
+            with self._lock:
+                self.stats["misses"] += 1
+            return None
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT is_valid FROM verdicts WHERE key = ? AND etag = ? AND size = ?",
+                (key, etag, size),
+            ).fetchone()
+            self.stats["misses" if row is None else "hits"] += 1
+        return None if row is None else bool(row[0])
+
+    def put(self, key: str, etag: str | None, size: int | None, is_valid: bool) -> None:
+        """Stores a verdict, replacing the one for an older version of the object."""
+        if etag is None or size is None:
+            return
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO verdicts VALUES (?, ?, ?, ?, ?)",
+                (key, etag, size, int(is_valid), time.time()),
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
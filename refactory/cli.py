@@ -1,7 +1,12 @@
 import click
 import ast
+from click.core import ParameterSource
 from .check_files.main import run_validation_pipeline
-from refactory.storage_connection import S3Provider
+from refactory.storage_connection import CernboxProvider, LocalProvider, S3Provider
+from refactory.concurrency import AIMDLimiter
+from refactory.listing_cache import S3ListingCache
+from refactory.metrics import InstrumentedProvider, Metrics
+from .check_files.verdict_cache import ValidationVerdictCache
 
 from .file_import.boite_matcher import BoiteS3Matcher
 
@@ -28,6 +33,192 @@ def parse_inventory(value):
     return value
 
 
+def build_listing_cache(listing_cache, cache_ttl, refresh_cache):
+    """Opens the shared on-disk S3 listing cache when one is requested."""
+    if not listing_cache:
+        return None
+    return S3ListingCache(listing_cache, ttl=cache_ttl, refresh=refresh_cache)
+
+
+def report_listing_cache(cache):
+    if cache is None:
+        return
+    stats = cache.stats
+    click.echo(
+        f"Listing cache: {stats['hits']} hits, {stats['misses']} misses "
+        f"({stats['changed']} changed, {stats['unchanged']} unchanged prefixes)."
+    )
+    cache.close()
+
+
+def local_root_option(command):
+    return click.option(
+        "--local-root",
+        default=None,
+        type=click.Path(exists=True, file_okay=False),
+        help="Directory (e.g. an EOS FUSE mount) holding the base path, used with --provider local.",
+    )(command)
+
+
+def build_local_provider(local_root):
+    if not local_root:
+        raise click.UsageError("--provider local needs --local-root.")
+    return LocalProvider(local_root)
+
+
+def listing_cache_options(command):
+    """
+    Adds the S3 listing cache options shared by the S3-backed commands;
+    `reject_s3_options` refuses them with another provider.
+    """
+    command = click.option(
+        "--refresh-cache",
+        is_flag=True,
+        help="Revalidate every cached prefix used in this run against S3. S3 only.",
+    )(command)
+    command = click.option(
+        "--cache-ttl",
+        default=86400,
+        show_default=True,
+        type=int,
+        help="Seconds a cached S3 listing is reused before it is listed again. S3 only.",
+    )(command)
+    command = click.option(
+        "--listing-cache",
+        default=None,
+        help="Path to a SQLite file caching S3 listings across runs (disabled by default). S3 only.",
+    )(command)
+    return command
+
+
+# Options of `listing_cache_options` and `s3_concurrency_options`, which only S3Provider uses
+S3_ONLY_PARAMS = (
+    "listing_cache",
+    "cache_ttl",
+    "refresh_cache",
+    "retry_mode",
+    "max_attempts",
+    "adaptive_concurrency",
+    "latency_target",
+)
+
+
+def s3_concurrency_options(command):
+    """
+    Adds the S3 retry and adaptive concurrency options shared by the S3-backed
+    commands; `reject_s3_options` refuses them with another provider.
+    """
+    command = click.option(
+        "--latency-target",
+        default=None,
+        type=click.FloatRange(min=0, min_open=True),
+        help="With --adaptive-concurrency, S3 requests slower than this many seconds do not raise the limit. S3 only.",
+    )(command)
+    command = click.option(
+        "--adaptive-concurrency",
+        is_flag=True,
+        help="Cap concurrent S3 requests with an AIMD limit: halved when S3 throttles (SlowDown/503), raised by one per healthy round. S3 only.",
+    )(command)
+    command = click.option(
+        "--max-attempts",
+        default=10,
+        show_default=True,
+        type=click.IntRange(min=1),
+        help="Attempts per S3 request, including the first one. S3 only.",
+    )(command)
+    command = click.option(
+        "--retry-mode",
+        type=click.Choice(["legacy", "standard", "adaptive"]),
+        default="adaptive",
+        show_default=True,
+        help="botocore retry mode for S3 requests; adaptive also rate-limits after throttling. S3 only.",
+    )(command)
+    return command
+
+
+def build_s3_provider(
+    bucket,
+    concurrency,
+    retry_mode,
+    max_attempts,
+    adaptive_concurrency,
+    latency_target,
+    **kwargs,
+):
+    """An S3Provider whose connection pool covers `concurrency` threads, with an AIMD limiter if requested."""
+    limiter = (
+        AIMDLimiter(maximum=concurrency, latency_target=latency_target)
+        if adaptive_concurrency
+        else None
+    )
+    return S3Provider(
+        bucket=bucket,
+        max_pool_connections=max(10, concurrency),
+        retry_mode=retry_mode,
+        max_attempts=max_attempts,
+        limiter=limiter,
+        **kwargs,
+    )
+
+
+def reject_s3_options(provider_name):
+    """Fails on S3 listing cache, retry or concurrency options given with another provider, which would ignore them."""
+    context = click.get_current_context()
+    given = [
+        f"--{name.replace('_', '-')}"
+        for name in S3_ONLY_PARAMS
+        if context.get_parameter_source(name)
+        not in (None, ParameterSource.DEFAULT, ParameterSource.DEFAULT_MAP)
+    ]
+    if given:
+        raise click.UsageError(
+            f"{', '.join(given)}: S3 only, not used with --provider {provider_name}."
+        )
+
+
+def report_limiter(provider):
+    limiter = getattr(provider, "limiter", None)
+    if limiter is None:
+        return
+    stats = limiter.stats
+    click.echo(
+        f"Adaptive concurrency: limit {int(limiter.limit)} of {limiter.maximum} "
+        f"(between {stats['lowest_limit']} and {stats['highest_limit']}), "
+        f"{stats['throttles']} throttled requests, {stats['decreases']} decreases."
+    )
+
+
+def metrics_options(command):
+    """Adds the run metrics outputs shared by the commands."""
+    command = click.option(
+        "--prometheus-textfile",
+        default=None,
+        help="Write the run metrics in Prometheus text format here (e.g. the node exporter's textfile directory, *.prom).",
+    )(command)
+    command = click.option(
+        "--metrics-json",
+        default=None,
+        help="Write a JSON summary of stage timings and storage calls (count, bytes, latency) here.",
+    )(command)
+    return command
+
+
+def instrument(provider, metrics, metrics_json, prometheus_textfile):
+    """Wraps the provider to record its calls when a metrics output is requested."""
+    if metrics_json or prometheus_textfile:
+        return InstrumentedProvider(provider, metrics)
+    return provider
+
+
+def write_metrics(metrics, metrics_json, prometheus_textfile):
+    if metrics_json:
+        metrics.write_json(metrics_json)
+        click.echo(f"Metrics written to {metrics_json}")
+    if prometheus_textfile:
+        metrics.write_prometheus(prometheus_textfile)
+        click.echo(f"Prometheus metrics written to {prometheus_textfile}")
+
+
 @click.group()
 def digitization_v2():
     pass
@@ -53,6 +244,20 @@ def digitization_v2():
     show_default=True,
     help="S3 Bucket name.",
 )
+@click.option(
+    "--provider",
+    "provider_name",
+    type=click.Choice(["s3", "cernbox", "local"]),
+    default="s3",
+    show_default=True,
+    help="Storage holding the PDFs to validate.",
+)
+@local_root_option
+@click.option(
+    "--cernbox-link",
+    default=None,
+    help="Public link hash of the CERNBox share to validate (credentials from the environment otherwise).",
+)
 @click.option(
     "-p",
     "--base-path",
@@ -60,14 +265,103 @@ def digitization_v2():
     show_default=True,
     help="Base S3 path to validate.",
 )
-def validate_files_integrity(data_source, base_path, bucket, upload_reports):
+@click.option(
+    "--download-workers",
+    default=1,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of concurrent downloads.",
+)
+@click.option(
+    "--validate-workers",
+    default=1,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of processes validating downloaded PDFs.",
+)
+@click.option(
+    "--range-precheck",
+    is_flag=True,
+    help="Reject truncated or non-PDF objects from ranged header/trailer reads before downloading.",
+)
+@click.option(
+    "--memory-limit",
+    default=0,
+    show_default=True,
+    type=click.IntRange(min=0),
+    help="Validate PDFs up to this many MB in memory instead of a temp file (0 disables).",
+)
+@click.option(
+    "--incremental",
+    is_flag=True,
+    help="Only download and validate objects that are new or changed since a previous run.",
+)
+@click.option(
+    "--verdict-cache",
+    default="pdf_validation_cache.sqlite3",
+    show_default=True,
+    help="SQLite file storing validation verdicts by key, ETag and size (used with --incremental).",
+)
+@click.option(
+    "--resume",
+    is_flag=True,
+    help="Continue an interrupted run, skipping files already in its journal.",
+)
+@listing_cache_options
+@s3_concurrency_options
+@metrics_options
+def validate_files_integrity(
+    data_source,
+    base_path,
+    bucket,
+    provider_name,
+    local_root,
+    cernbox_link,
+    upload_reports,
+    download_workers,
+    validate_workers,
+    range_precheck,
+    memory_limit,
+    incremental,
+    verdict_cache,
+    resume,
+    listing_cache,
+    cache_ttl,
+    refresh_cache,
+    retry_mode,
+    max_attempts,
+    adaptive_concurrency,
+    latency_target,
+    metrics_json,
+    prometheus_textfile,
+):
     """
     Validates files integrity and inventory alignment.
     This command checks for corrupted files and missing boxes.
     """
 
     inventory_input = parse_inventory(data_source)
-    provider = S3Provider(bucket=bucket)
+    if provider_name != "s3":
+        reject_s3_options(provider_name)
+    cache = build_listing_cache(listing_cache, cache_ttl, refresh_cache)
+    if provider_name == "cernbox":
+        provider = CernboxProvider(public_link_hash=cernbox_link)
+    elif provider_name == "local":
+        provider = build_local_provider(local_root)
+    else:
+        # Box listings (8 threads) overlap with the downloads
+        provider = build_s3_provider(
+            bucket,
+            download_workers + 8,
+            retry_mode,
+            max_attempts,
+            adaptive_concurrency,
+            latency_target,
+            listing_cache=cache,
+        )
+    verdicts = ValidationVerdictCache(verdict_cache) if incremental else None
+    metrics = Metrics("validate-files-integrity")
+    provider = instrument(provider, metrics, metrics_json, prometheus_textfile)
 
     try:
         run_validation_pipeline(
@@ -76,10 +370,27 @@ def validate_files_integrity(data_source, base_path, bucket, upload_reports):
             log_file="s3_pdf_issues.log",
             data_source=inventory_input,
             upload_reports=upload_reports,
+            download_workers=download_workers,
+            validate_workers=validate_workers,
+            range_precheck=range_precheck,
+            memory_limit=memory_limit * 1024 * 1024,
+            verdict_cache=verdicts,
+            resume=resume,
+            metrics=metrics,
         )
         click.echo("Process finished. Check the generated logs for details.")
     except Exception as e:
         click.secho(f"Error: {e}", fg="red", err=True)
+    finally:
+        report_listing_cache(cache)
+        report_limiter(provider)
+        if verdicts is not None:
+            click.echo(
+                f"Verdict cache: {verdicts.stats['hits']} reused, "
+                f"{verdicts.stats['misses']} validated."
+            )
+            verdicts.close()
+        write_metrics(metrics, metrics_json, prometheus_textfile)
 
 
 @digitization_v2.command("file-match")
@@ -117,8 +428,75 @@ def validate_files_integrity(data_source, base_path, bucket, upload_reports):
     show_default=True,
     help="S3 Bucket name.",
 )
-
-def file_match(data_source, base_path, output_path, file_types, bucket):
+@click.option(
+    "--provider",
+    "provider_name",
+    type=click.Choice(["s3", "local"]),
+    default="s3",
+    show_default=True,
+    help="Storage holding the files to match.",
+)
+@local_root_option
+@click.option(
+    "-w",
+    "--workers",
+    default=1,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of Boite files processed concurrently.",
+)
+@click.option(
+    "--near-match-distance",
+    default=0,
+    show_default=True,
+    type=click.IntRange(min=0),
+    help="Also suggest S3 keys within this edit distance of a missing record (0 = normalized name only).",
+)
+@click.option(
+    "--engine",
+    type=click.Choice(BoiteS3Matcher.ENGINES),
+    default="python",
+    show_default=True,
+    help="Matching engine: row by row, or vectorized pandas joins for large Boites.",
+)
+@click.option(
+    "--download-dir",
+    default=None,
+    help="Keep CERNBox Boite files here between runs; unchanged files (same ETag) are not downloaded again.",
+)
+@click.option(
+    "--download-workers",
+    default=8,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of concurrent CERNBox downloads.",
+)
+@listing_cache_options
+@s3_concurrency_options
+@metrics_options
+def file_match(
+    data_source,
+    base_path,
+    output_path,
+    file_types,
+    bucket,
+    provider_name,
+    local_root,
+    workers,
+    near_match_distance,
+    engine,
+    download_dir,
+    download_workers,
+    listing_cache,
+    cache_ttl,
+    refresh_cache,
+    retry_mode,
+    max_attempts,
+    adaptive_concurrency,
+    latency_target,
+    metrics_json,
+    prometheus_textfile,
+):
     """
     Matches Boite Excel records against S3 files and generates JSON payloads.
     Generates a success JSON per Boite and a unified mismatch log.
@@ -130,10 +508,28 @@ def file_match(data_source, base_path, output_path, file_types, bucket):
         # "PDF_LATEX": 45
     }
 
-    provider = S3Provider(bucket=bucket, custom_expiration=CUSTOM_EXPIRATION)
-
     parsed_file_types = [t.strip() for t in file_types.split(",")]
 
+    if provider_name != "s3":
+        reject_s3_options(provider_name)
+    cache = build_listing_cache(listing_cache, cache_ttl, refresh_cache)
+    if provider_name == "local":
+        provider = build_local_provider(local_root)
+    else:
+        # Each Boite lists its file type prefixes concurrently
+        provider = build_s3_provider(
+            bucket,
+            workers * len(parsed_file_types),
+            retry_mode,
+            max_attempts,
+            adaptive_concurrency,
+            latency_target,
+            custom_expiration=CUSTOM_EXPIRATION,
+            listing_cache=cache,
+        )
+    metrics = Metrics("file-match")
+    provider = instrument(provider, metrics, metrics_json, prometheus_textfile)
+
     click.echo("Starting match process...")
     click.echo(f"Source: {data_source}")
     click.echo(f"File types: {', '.join(parsed_file_types)}")
@@ -145,6 +541,12 @@ def file_match(data_source, base_path, output_path, file_types, bucket):
             data_source=data_source,
             output_path=output_path,
             file_types=parsed_file_types,
+            workers=workers,
+            near_match_distance=near_match_distance,
+            engine=engine,
+            download_dir=download_dir,
+            download_workers=download_workers,
+            metrics=metrics,
         )
 
         matcher.execute()
@@ -154,6 +556,10 @@ def file_match(data_source, base_path, output_path, file_types, bucket):
         )
     except Exception as e:
         click.secho(f"Error during matching: {e}", fg="red", err=True)
+    finally:
+        report_listing_cache(cache)
+        report_limiter(provider)
+        write_metrics(metrics, metrics_json, prometheus_textfile)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,124 @@
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+# Error codes and HTTP statuses S3-compatible servers use to ask clients to slow down
+THROTTLE_CODES = frozenset(
+    {
+        "SlowDown",
+        "Throttling",
+        "ThrottlingException",
+        "RequestLimitExceeded",
+        "TooManyRequests",
+        "RequestThrottled",
+        "ServiceUnavailable",
+    }
+)
+THROTTLE_STATUSES = frozenset({429, 503})
+
+
+class AIMDLimiter:
+    """
+    Caps the number of storage requests in flight with additive-increase /
+    multiplicative-decrease, like TCP congestion control.
+
+    Each request holds a `slot()`. Every `limit` healthy completions (about one
+    round of requests) raise the limit by one, up to `maximum`; a completion
+    slower than `latency_target` seconds does not count as healthy. Each
+    throttling signal (`on_throttle`) multiplies the limit by `decrease_factor`,
+    down to `minimum`, but only once per round: throttles reported by requests
+    started before the last decrease are counted and otherwise ignored.
+
+    Throttles from threads that hold no slot (e.g. s3transfer's workers for a
+    multipart download) cannot be dated that way; they decrease the limit at
+    most once per `hold_off` seconds, or per average slot latency if longer.
+    """
+
+    def __init__(
+        self,
+        maximum: int,
+        initial: int = None,
+        minimum: int = 1,
+        decrease_factor: float = 0.5,
+        latency_target: float = None,
+        hold_off: float = 1.0,
+    ):
+        self.maximum = max(1, maximum)
+        self.minimum = max(1, min(minimum, self.maximum))
+        self.limit = float(
+            min(self.maximum, max(self.minimum, initial or self.maximum // 2))
+        )
+        self.decrease_factor = decrease_factor
+        self.latency_target = latency_target
+        self.hold_off = hold_off
+        # Moving average of slot latencies: about the length of one round
+        self._round_seconds = 0.0
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self._in_flight = 0
+        self._healthy = 0
+        self._last_decrease = float("-inf")
+        self.stats = {
+            "throttles": 0,
+            "decreases": 0,
+            "increases": 0,
+            "lowest_limit": int(self.limit),
+            "highest_limit": int(self.limit),
+        }
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """Waits until fewer than `limit` requests are in flight and holds a slot for the block."""
+        with self._cond:
+            while self._in_flight >= int(self.limit):
+                self._cond.wait()
+            self._in_flight += 1
+        started = self._local.started = time.monotonic()
+        succeeded = False
+        try:
+            yield
+            succeeded = True
+        finally:
+            latency = time.monotonic() - started
+            self._local.started = None
+            with self._cond:
+                self._in_flight -= 1
+                self._round_seconds += 0.2 * (latency - self._round_seconds)
+                if succeeded:
+                    self._on_success(latency)
+                self._cond.notify_all()
+
+    def _on_success(self, latency: float) -> None:
+        if self.latency_target is not None and latency > self.latency_target:
+            return
+        self._healthy += 1
+        if self._healthy >= int(self.limit) and self.limit < self.maximum:
+            self._healthy = 0
+            self.limit = min(self.maximum, self.limit + 1)
+            self.stats["increases"] += 1
+            self.stats["highest_limit"] = max(self.stats["highest_limit"], int(self.limit))
+
+    def on_throttle(self) -> None:
+        """Reports a throttled request; called from the thread holding its slot where possible."""
+        started = getattr(self._local, "started", None)
+        with self._cond:
+            self.stats["throttles"] += 1
+            now = time.monotonic()
+            # Sent under the old limit: the decrease it calls for has already happened
+            if started is not None and started < self._last_decrease:
+                return
+            # Not sent from a slot: assume it was if it comes within a round of the last decrease
+            if started is None and now - self._last_decrease < max(
+                self.hold_off, self._round_seconds
+            ):
+                return
+            self._last_decrease = now
+            self._healthy = 0
+            self.limit = max(self.minimum, self.limit * self.decrease_factor)
+            self.stats["decreases"] += 1
+            self.stats["lowest_limit"] = min(self.stats["lowest_limit"], int(self.limit))
+
+
+def is_throttle_response(http_status: int | None, error_code: str | None) -> bool:
+    return http_status in THROTTLE_STATUSES or error_code in THROTTLE_CODES
@@ -1,17 +1,23 @@
 import json
 import os
 import re
+import numpy as np
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from urllib.parse import urlparse
 
+from .near_match import NearMatchIndex
 from .utils import fetch_boite_files, transform_box_file_name
+from ..metrics import Metrics
 from ..storage_connection import StorageProvider
 
 
 class BoiteS3Matcher:
     """Matches Boite Excel records with S3 files and logs discrepancies."""
 
+    ENGINES = ("python", "vectorized")
+
     def __init__(
         self,
         provider: StorageProvider,
@@ -19,13 +25,28 @@ class BoiteS3Matcher:
         data_source: str,
         output_path: str,
         file_types: list[str] | None = None,
+        workers: int = 1,
+        near_match_distance: int = 0,
+        engine: str = "python",
+        download_dir: str | None = None,
+        download_workers: int = 8,
+        metrics: Metrics | None = None,
     ):
         """Initializes the matcher with storage, data output, data path, and target file types."""
         self.provider = provider
+        # Stage timings of the run: data source, Excel parsing, listing, matching, export
+        self.metrics = metrics if metrics is not None else Metrics("file-match")
+        self.workers = max(1, workers)
+        self.near_match_distance = near_match_distance
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unknown matching engine: {engine}")
+        self.engine = engine
         self.base_path = Path(base_path)
         self.output_path = Path(output_path)
         self.output_path.mkdir(parents=True, exist_ok=True)
         self.file_types = file_types or ["PDF", "PDF_LATEX"]
+        self.download_dir = download_dir
+        self.download_workers = download_workers
         self.data_path = self._prepare_data_path(data_source)
 
     def _is_url(self, value: str) -> bool:
@@ -34,7 +55,12 @@ class BoiteS3Matcher:
     def _prepare_data_path(self, data_source: str) -> Path:
         """Returns the local path or delegates the download if a URL is provided."""
         if self._is_url(data_source):
-            return Path(fetch_boite_files(data_source))
+            with self.metrics.span("data_source"):
+                return Path(
+                    fetch_boite_files(
+                        data_source, self.download_dir, workers=self.download_workers
+                    )
+                )
         return Path(data_source)
 
     def _get_base_filename(self, filename: str) -> str:
@@ -46,32 +72,55 @@ class BoiteS3Matcher:
             return lower_name.rsplit(".", 1)[0]
         return lower_name
 
+    def _get_base_filenames(self, names: pd.Series) -> pd.Series:
+        """Column-wise `_get_base_filename` over a Series of file names."""
+        # The leftmost suffix wins, so `_latex.pdf` is stripped before `.pdf`
+        return names.str.lower().str.replace(
+            r"(?:_latex\.pdf|\.pdf|\.tiff|\.tif)\Z", "", regex=True
+        )
+
+    _NON_ALPHANUMERIC = re.compile(r"[^a-z0-9]")
+
     def _normalize_for_comparison(self, name: str) -> str:
         """Removes all non-alphanumeric characters for fuzzy matching and review suggestions."""
-        return re.sub(r"[^a-z0-9]", "", name.lower())
+        return self._NON_ALPHANUMERIC.sub("", name.lower())
+
+    def _build_near_match_index(
+        self, ftype: str, unused_keys: set[str]
+    ) -> NearMatchIndex:
+        """Indexes unused S3 keys by normalized file name (and parent folder for PDF)."""
+        index = NearMatchIndex(self.near_match_distance)
+        for s3_key in unused_keys:
+            parts = s3_key.split("/")
+            index.add(
+                self._normalize_for_comparison(self._get_base_filename(parts[-1])),
+                s3_key,
+            )
+            if ftype == "PDF":
+                folder = parts[-2] if len(parts) > 1 else ""
+                index.add(self._normalize_for_comparison(folder), s3_key)
+        return index
 
-    def _load_s3_cache_for_boite(
-        self, box_file: str
-    ) -> tuple[dict[str, dict[str, str]], dict[str, set[str]]]:
-        """Pre-loads and filters S3 keys for match"""
-        cache: dict[str, dict[str, str]] = {}
-        available_keys: dict[str, set[str]] = {}
+    def _list_boite_keys(self, box_file: str) -> dict[str, list[str]]:
+        """Lists and filters the S3 keys of a Boite per file type, in listing order."""
+        keys_by_type: dict[str, list[str]] = {}
 
         folder_pattern = re.compile(r"(?i:BOITE)[\-_]O0(\d+)(?:[\-_]\w+)?")
         match = folder_pattern.search(box_file)
 
         if not match:
             print('No Boile file found.')
-            return {ft: {} for ft in self.file_types}, {
-                ft: set() for ft in self.file_types
-            }
+            return {ft: [] for ft in self.file_types}
 
         target_number = match.group(1)
 
-        for filetype in self.file_types:
-            prefix = f"{self.base_path}/{filetype}/BOITE_O0{target_number}"
-            all_raw_keys = self.provider.list_files(prefix)
+        prefixes = {
+            f"{self.base_path}/{filetype}/BOITE_O0{target_number}": filetype
+            for filetype in self.file_types
+        }
 
+        for prefix, all_raw_keys in self.provider.list_files_many(list(prefixes)):
+            filetype = prefixes[prefix]
             valid_keys: list[str] = []
 
             for key in all_raw_keys:
@@ -83,26 +132,29 @@ class BoiteS3Matcher:
                 if s3_match and s3_match.group(1) == target_number:
                     valid_keys.append(key)
 
-            cache[filetype] = {
-                self._get_base_filename(k.split("/")[-1]): k for k in valid_keys
-            }
-            available_keys[filetype] = set(valid_keys)
+            keys_by_type[filetype] = valid_keys
 
-        return cache, available_keys
+        return keys_by_type
 
-    def process_boite(
-        self, box_file: str
-    ) -> tuple[list[dict], dict]:
-        """Processes a single Boite file in-memory and returns the mapped records alongside mismatch data."""
-        print(f"📦 Processing {box_file}...")
-        df = pd.read_excel(self.data_path / box_file, header=None)
-        boite_name_s3 = transform_box_file_name(box_file)
+    def _content_type_for(self, ftype: str) -> str | None:
+        return "application/pdf" if ftype in ["PDF", "PDF_LATEX"] else None
 
-        s3_cache, s3_available_keys = self._load_s3_cache_for_boite(box_file)
+    def _match_records(
+        self, df: pd.DataFrame, keys_by_type: dict[str, list[str]]
+    ) -> tuple[list[dict], list[dict], dict[str, set[str]]]:
+        """Row-by-row matching of Excel records against per-type S3 lookups."""
+        s3_cache = {
+            ftype: {self._get_base_filename(k.split("/")[-1]): k for k in keys}
+            for ftype, keys in keys_by_type.items()
+        }
 
         records_data: list[dict] = []
         missing_in_s3: list[dict] = []
         used_s3_keys: dict[str, set[str]] = {ftype: set() for ftype in self.file_types}
+        # (record_data, matched S3 key) pairs per file type, presigned in bulk after the scan
+        to_presign: dict[str, list[tuple[dict, str]]] = {
+            ftype: [] for ftype in self.file_types
+        }
 
         for _, row in df.iterrows():
             record_id, record_name = str(row[0]).strip(), str(row[1]).strip()
@@ -116,12 +168,8 @@ class BoiteS3Matcher:
                 matched_key = s3_cache[ftype].get(search_name)
 
                 if matched_key:
-                    content_type = (
-                        "application/pdf" if ftype in ["PDF", "PDF_LATEX"] else None
-                    )
-                    record_data[url_key] = self.provider.generate_presigned_url(
-                        matched_key, ftype, content_type
-                    )
+                    record_data[url_key] = None
+                    to_presign[ftype].append((record_data, matched_key))
                     used_s3_keys[ftype].add(matched_key)
                 else:
                     record_data[url_key] = None
@@ -137,38 +185,138 @@ class BoiteS3Matcher:
                 )
             records_data.append(record_data)
 
-        missing_in_boite = [
-            {"s3_key": key, "filetype": ftype}
-            for ftype in self.file_types
-            for key in (s3_available_keys[ftype] - used_s3_keys[ftype])
+        for ftype, pending in to_presign.items():
+            urls = self.provider.generate_presigned_urls(
+                [key for _, key in pending], ftype, self._content_type_for(ftype)
+            )
+            url_key = f"{ftype.lower()}_url"
+            for (record_data, _), url in zip(pending, urls):
+                record_data[url_key] = url
+
+        return records_data, missing_in_s3, used_s3_keys
+
+    def _match_records_vectorized(
+        self, df: pd.DataFrame, keys_by_type: dict[str, list[str]]
+    ) -> tuple[list[dict], list[dict], dict[str, set[str]]]:
+        """Same result as `_match_records`, computed with column operations and joins."""
+        # An empty sheet has no record to match
+        if df.empty:
+            return [], [], {ftype: set() for ftype in self.file_types}
+        # Without a name column, fail like `row[1]` does in `_match_records`
+        if df.shape[1] < 2:
+            raise KeyError(1)
+        # df.to_numpy() yields the same scalars iterrows() would, so str() agrees
+        values = df.to_numpy()
+        record_ids = pd.Series(values[:, 0], dtype=object).map(str).str.strip()
+        record_names = pd.Series(values[:, 1], dtype=object).map(str).str.strip()
+        records = pd.DataFrame(
+            {"search_name": self._get_base_filenames(record_names)}
+        )
+
+        matched_keys: dict[str, np.ndarray] = {}
+        used_s3_keys: dict[str, set[str]] = {}
+        url_columns: dict[str, list] = {}
+
+        for ftype in self.file_types:
+            keys = pd.Series(keys_by_type[ftype], dtype=object)
+            lookup = pd.DataFrame(
+                {
+                    "search_name": self._get_base_filenames(
+                        keys.str.replace(r"(?s)^.*/", "", regex=True)
+                    ),
+                    "s3_key": keys,
+                }
+            ).drop_duplicates("search_name", keep="last")
+
+            joined = records.merge(lookup, on="search_name", how="left")["s3_key"]
+            found = joined.notna().to_numpy()
+            matched = joined[found]
+            matched_keys[ftype] = found
+            used_s3_keys[ftype] = set(matched)
+
+            urls = np.full(len(records), None, dtype=object)
+            urls[found] = self.provider.generate_presigned_urls(
+                matched.tolist(), ftype, self._content_type_for(ftype)
+            )
+            url_columns[f"{ftype.lower()}_url"] = urls.tolist()
+
+        record_ids, record_names = record_ids.tolist(), record_names.tolist()
+        columns = ["record_id", *url_columns]
+        records_data = [
+            dict(zip(columns, row))
+            for row in zip(record_ids, *url_columns.values())
         ]
 
-        near_matches = []
-        for missing_rec in missing_in_s3:
-            boite_norm = self._normalize_for_comparison(missing_rec["record_name"])
+        missing_mask = np.zeros(len(records), dtype=bool)
+        for found in matched_keys.values():
+            missing_mask |= ~found
+        missing_in_s3 = [
+            {
+                "record_id": record_ids[i],
+                "record_name": record_names[i],
+                "missing_types": [
+                    ftype for ftype in self.file_types if not matched_keys[ftype][i]
+                ],
+            }
+            for i in np.flatnonzero(missing_mask)
+        ]
 
-            for ftype in missing_rec["missing_types"]:
-                unused_s3 = s3_available_keys[ftype] - used_s3_keys[ftype]
+        return records_data, missing_in_s3, used_s3_keys
 
-                for s3_key in unused_s3:
-                    parts = s3_key.split("/")
-                    s3_base = self._get_base_filename(parts[-1])
-                    s3_norm = self._normalize_for_comparison(s3_base)
+    def process_boite(
+        self, box_file: str
+    ) -> tuple[list[dict], dict]:
+        """Processes a single Boite file in-memory and returns the mapped records alongside mismatch data."""
+        print(f"📦 Processing {box_file}...")
+        with self.metrics.span("excel_parsing"):
+            df = pd.read_excel(self.data_path / box_file, header=None)
+        boite_name_s3 = transform_box_file_name(box_file)
 
-                    folder_norm = ""
+        with self.metrics.span("listing"):
+            keys_by_type = self._list_boite_keys(box_file)
+        s3_available_keys = {
+            ftype: set(keys) for ftype, keys in keys_by_type.items()
+        }
 
-                    if ftype == "PDF" and len(parts) > 1:
-                        folder_norm = self._normalize_for_comparison(parts[-2])
+        # Includes presigning, which the storage metrics report on their own
+        with self.metrics.span("matching"):
+            if self.engine == "vectorized":
+                records_data, missing_in_s3, used_s3_keys = self._match_records_vectorized(
+                    df, keys_by_type
+                )
+            else:
+                records_data, missing_in_s3, used_s3_keys = self._match_records(
+                    df, keys_by_type
+                )
 
-                    if boite_norm == s3_norm or (ftype == "PDF" and boite_norm == folder_norm):
-                        near_matches.append(
-                            {
-                                "boite_record": missing_rec["record_name"],
-                                "suggested_s3_key": s3_key,
-                                "filetype": ftype
-                            }
+        missing_in_boite = [
+            {"s3_key": key, "filetype": ftype}
+            for ftype in self.file_types
+            for key in sorted(s3_available_keys[ftype] - used_s3_keys[ftype])
+        ]
+
+        with self.metrics.span("near_matches"):
+            near_matches = []
+            near_match_indexes: dict[str, NearMatchIndex] = {}
+            for missing_rec in missing_in_s3:
+                boite_norm = self._normalize_for_comparison(missing_rec["record_name"])
+
+                for ftype in missing_rec["missing_types"]:
+                    if ftype not in near_match_indexes:
+                        near_match_indexes[ftype] = self._build_near_match_index(
+                            ftype, s3_available_keys[ftype] - used_s3_keys[ftype]
                         )
 
+                    for s3_key, distance in near_match_indexes[ftype].lookup(boite_norm):
+                        suggestion = {
+                            "boite_record": missing_rec["record_name"],
+                            "suggested_s3_key": s3_key,
+                            "filetype": ftype,
+                        }
+                        if self.near_match_distance:
+                            suggestion["distance"] = distance
+                        near_matches.append(suggestion)
+
         mismatch_data = {
             "boite_file": box_file,
             "s3_folder_name": boite_name_s3,
@@ -190,27 +338,53 @@ class BoiteS3Matcher:
         ) as f:
             json.dump(records, f, indent=4, ensure_ascii=False)
 
-    def _export_unified_log(self, all_mismatches: list) -> None:
+    def _export_unified_log(self, all_mismatches: list, failed: list) -> None:
         """Saves consolidated mismatch log."""
         with open(
             self.output_path / "all_boites_mismatches.json", "w", encoding="utf-8"
         ) as f:
             json.dump(
-                {"total": len(all_mismatches), "details": all_mismatches},
+                {
+                    "total": len(all_mismatches),
+                    "details": all_mismatches,
+                    "failed": failed,
+                },
                 f,
                 indent=4,
                 ensure_ascii=False,
             )
 
+    def _process_and_export(self, box_file: str) -> tuple[list[dict], dict]:
+        with self.metrics.span("boite"):
+            records, mismatches = self.process_boite(box_file)
+            with self.metrics.span("export"):
+                self._export_records(box_file, records)
+        return records, mismatches
+
     def execute(self) -> dict[str, list[dict]]:
         """Export logs in Json and return records data in memory"""
-        results_map, all_mismatches = {}, []
-        for box_file in os.listdir(self.data_path):
-            if box_file.lower().endswith(".xlsx") and not box_file.startswith("~"):
-                records, mismatches = self.process_boite(box_file)
+        results_map, all_mismatches, failed = {}, [], []
+        box_files = sorted(
+            box_file
+            for box_file in os.listdir(self.data_path)
+            if box_file.lower().endswith(".xlsx") and not box_file.startswith("~")
+        )
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {
+                box_file: executor.submit(self._process_and_export, box_file)
+                for box_file in box_files
+            }
+            # Collect in file name order so the unified log does not depend on scheduling
+            for box_file in box_files:
+                try:
+                    records, mismatches = futures[box_file].result()
+                except Exception as e:
+                    print(f"❌ Failed to process {box_file}: {e}")
+                    failed.append({"boite_file": box_file, "error": str(e)})
+                    continue
                 results_map[box_file] = records
                 all_mismatches.append(mismatches)
-                self._export_records(box_file, records)
 
-        self._export_unified_log(all_mismatches)
+        self._export_unified_log(all_mismatches, failed)
         return results_map
@@ -0,0 +1,96 @@
+from collections import defaultdict
+
+
+def levenshtein(a: str, b: str, limit: int | None = None) -> int:
+    """Edit distance between two strings. Stops early once every path exceeds `limit`."""
+    if a == b:
+        return 0
+    if len(a) < len(b):
+        a, b = b, a
+    if limit is not None and len(a) - len(b) > limit:
+        return limit + 1
+
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(
+                min(
+                    previous[j] + 1,
+                    current[j - 1] + 1,
+                    previous[j - 1] + (char_a != char_b),
+                )
+            )
+        if limit is not None and min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class BKTree:
+    """Burkhard-Keller tree over strings for edit-distance range queries."""
+
+    def __init__(self):
+        self._root: tuple[str, dict] | None = None
+
+    def add(self, word: str) -> None:
+        if self._root is None:
+            self._root = (word, {})
+            return
+        node_word, children = self._root
+        while True:
+            distance = levenshtein(word, node_word)
+            if distance == 0:
+                return
+            child = children.get(distance)
+            if child is None:
+                children[distance] = (word, {})
+                return
+            node_word, children = child
+
+    def search(self, word: str, max_distance: int) -> list[tuple[str, int]]:
+        """Returns (word, distance) for every stored word within `max_distance`."""
+        if self._root is None:
+            return []
+        found, stack = [], [self._root]
+        while stack:
+            node_word, children = stack.pop()
+            distance = levenshtein(word, node_word)
+            if distance <= max_distance:
+                found.append((node_word, distance))
+            for child_distance, child in children.items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        return found
+
+
+class NearMatchIndex:
+    """
+    Normalized S3 names -> keys, built once per Boite and file type.
+
+    With `max_distance` 0 lookups are a single hash probe. Above 0 a BK-tree
+    over the distinct normalized names also returns names within that edit
+    distance, so typo-level suggestions stay sub-quadratic.
+    """
+
+    def __init__(self, max_distance: int = 0):
+        self.max_distance = max_distance
+        self._keys: dict[str, set[str]] = defaultdict(set)
+        self._tree = BKTree() if max_distance > 0 else None
+
+    def add(self, normalized: str, s3_key: str) -> None:
+        if self._tree is not None and normalized not in self._keys:
+            self._tree.add(normalized)
+        self._keys[normalized].add(s3_key)
+
+    def lookup(self, normalized: str) -> list[tuple[str, int]]:
+        """Returns (s3_key, distance) pairs ordered by distance, then key."""
+        if self._tree is None:
+            return [(key, 0) for key in sorted(self._keys.get(normalized, ()))]
+
+        best: dict[str, int] = {}
+        for name, distance in self._tree.search(normalized, self.max_distance):
+            for key in self._keys[name]:
+                if distance < best.get(key, distance + 1):
+                    best[key] = distance
+        return sorted(best.items(), key=lambda item: (item[1], item[0]))
@@ -1,5 +1,8 @@
+import json
 import os
+import posixpath
 import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from urllib.parse import urlparse
 from ..storage_connection import CernboxProvider
 
@@ -24,15 +27,51 @@ def parse_cernbox_url(url: str) -> dict:
         raise ValueError(f"Invalid CERNBox URL format: {url}")
 
 
-def fetch_boite_files(url: str, output_dir: str = None) -> str:
+ETAGS_FILE = ".etags.json"
+
+
+def _load_etags(output_dir: str) -> dict:
+    try:
+        with open(os.path.join(output_dir, ETAGS_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_etags(output_dir: str, etags: dict) -> None:
+    etags_path = os.path.join(output_dir, ETAGS_FILE)
+    with open(f"{etags_path}.part", "w", encoding="utf-8") as f:
+        json.dump(etags, f, indent=2, sort_keys=True)
+    os.replace(f"{etags_path}.part", etags_path)
+
+
+def _remove_stale_files(output_dir: str, remote_names, etags: dict) -> None:
+    """Deletes the local workbooks deleted or renamed on CERNBox, so they are no longer matched."""
+    stale = [
+        name
+        for name in os.listdir(output_dir)
+        if name.lower().endswith(".xlsx") and name not in remote_names
+    ]
+    for name in stale:
+        os.remove(os.path.join(output_dir, name))
+        print(f"Removed (no longer on CERNBox): {name}")
+    for name in set(etags) - set(remote_names):
+        del etags[name]
+
+
+def fetch_boite_files(url: str, output_dir: str = None, workers: int = 8) -> str:
     """
-    Downloads all .xlsx files from a CERNBox URL.
+    Downloads all .xlsx files from a CERNBox URL, `workers` at a time.
+    Files already in `output_dir` are only downloaded again if their ETag changed,
+    and local .xlsx files no longer in the share are removed.
     """
     print(f"Fetch URL: {url}")
 
     parsed_data = parse_cernbox_url(url)
 
-    provider = CernboxProvider(public_link_hash=parsed_data["public_link_hash"])
+    provider = CernboxProvider(
+        public_link_hash=parsed_data["public_link_hash"], pool_size=max(workers, 1)
+    )
 
     if output_dir is None:
         output_dir = tempfile.mkdtemp(prefix="boite_data_")
@@ -43,29 +82,54 @@ def fetch_boite_files(url: str, output_dir: str = None) -> str:
     target_path = parsed_data["eos_path"] if parsed_data["eos_path"] else ""
 
     try:
-        xlsx_files = provider.list_files(target_path, extension=".xlsx")
+        # The Boites are the .xlsx files directly in the shared folder
+        xlsx_files = {
+            posixpath.basename(key): key
+            for key in provider.list_folder_files(target_path, extension=".xlsx")
+        }
     except Exception as e:
         print(f"Failed to access CERNBox. Error: {e}")
         return output_dir
 
+    etags = _load_etags(output_dir)
+    _remove_stale_files(output_dir, xlsx_files, etags)
+
     if not xlsx_files:
+        _save_etags(output_dir, etags)
         print("No .xlsx files found.")
         return output_dir
 
     print(f"Found {len(xlsx_files)} files. Starting download...")
 
-    for filename in xlsx_files:
+    def download(filename):
         local_path = os.path.join(output_dir, filename)
-
-        remote_file_path = (
-            f"{target_path.rstrip('/')}/{filename}" if target_path else filename
+        return provider.download_if_changed(
+            xlsx_files[filename], local_path, etags.get(filename)
         )
 
-        try:
-            print(f"Downloading: {filename}...")
-            provider.download_to_temp(remote_file_path, local_path)
-        except Exception as e:
-            print(f"Failed to download {filename}: {e}")
+    downloaded = unchanged = 0
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        futures = {executor.submit(download, filename): filename for filename in xlsx_files}
+        for future in as_completed(futures):
+            filename = futures[future]
+            try:
+                changed, etag = future.result()
+            except Exception as e:
+                print(f"Failed to download {filename}: {e}")
+                etags.pop(filename, None)
+                continue
+            if changed:
+                downloaded += 1
+                print(f"Downloaded: {filename}")
+            else:
+                unchanged += 1
+            if etag:
+                etags[filename] = etag
+            else:
+                etags.pop(filename, None)
+
+    _save_etags(output_dir, etags)
+    print(f"{downloaded} files downloaded, {unchanged} unchanged.")
     return output_dir
 
 
@@ -0,0 +1,127 @@
+import sqlite3
+import threading
+import time
+
+
+class S3ListingCache:
+    """Persistent SQLite store of S3 listings (key, size, ETag, LastModified) per prefix."""
+
+    def __init__(self, db_path: str, ttl: int = 86400, refresh: bool = False):
+        """
+        ttl: seconds a stored listing is served without going back to S3.
+        refresh: revalidate every prefix touched in this run, even fresh ones.
+        """
+        self.db_path = db_path
+        self.ttl = ttl
+        self.refresh = refresh
+        # (bucket, prefix, mode) listed in this run: with `refresh`, these are fresh again
+        self._refreshed = set()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS listings (
+                bucket TEXT NOT NULL,
+                prefix TEXT NOT NULL,
+                mode TEXT NOT NULL,
+                listed_at REAL NOT NULL,
+                PRIMARY KEY (bucket, prefix, mode)
+            );
+            CREATE TABLE IF NOT EXISTS entries (
+                bucket TEXT NOT NULL,
+                prefix TEXT NOT NULL,
+                mode TEXT NOT NULL,
+                key TEXT NOT NULL,
+                size INTEGER,
+                etag TEXT,
+                last_modified TEXT,
+                PRIMARY KEY (bucket, prefix, mode, key)
+            );
+            """
+        )
+        self._conn.commit()
+        self.stats = {"hits": 0, "misses": 0, "changed": 0, "unchanged": 0}
+
+    def get(self, bucket: str, prefix: str, mode: str) -> list[dict] | None:
+        """
+        Returns the stored listing, or None when it is missing, stale or not yet
+        refreshed in this run.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT listed_at FROM listings WHERE bucket = ? AND prefix = ? AND mode = ?",
+                (bucket, prefix, mode),
+            ).fetchone()
+            if (
+                row is None
+                or (self.refresh and (bucket, prefix, mode) not in self._refreshed)
+                or time.time() - row[0] > self.ttl
+            ):
+                self.stats["misses"] += 1
+                return None
+
+            self.stats["hits"] += 1
+            rows = self._conn.execute(
+                "SELECT key, size, etag, last_modified FROM entries "
+                "WHERE bucket = ? AND prefix = ? AND mode = ? ORDER BY key",
+                (bucket, prefix, mode),
+            ).fetchall()
+        return [
+            {"key": key, "size": size, "etag": etag, "last_modified": last_modified}
+            for key, size, etag, last_modified in rows
+        ]
+
+    def put(self, bucket: str, prefix: str, mode: str, entries: list[dict]) -> bool:
+        """
+        Stores a fresh listing, only touching rows that were added, removed or modified.
+        Returns True when the prefix changed since it was last stored.
+        """
+        fresh = {
+            e["key"]: (e.get("size"), e.get("etag"), e.get("last_modified"))
+            for e in entries
+        }
+        with self._lock, self._conn:
+            stored = {
+                key: (size, etag, last_modified)
+                for key, size, etag, last_modified in self._conn.execute(
+                    "SELECT key, size, etag, last_modified FROM entries "
+                    "WHERE bucket = ? AND prefix = ? AND mode = ?",
+                    (bucket, prefix, mode),
+                )
+            }
+            removed = stored.keys() - fresh.keys()
+            upserts = [
+                (bucket, prefix, mode, key, *values)
+                for key, values in fresh.items()
+                if stored.get(key) != values
+            ]
+
+            self._conn.executemany(
+                "DELETE FROM entries WHERE bucket = ? AND prefix = ? AND mode = ? AND key = ?",
+                [(bucket, prefix, mode, key) for key in removed],
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)", upserts
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO listings VALUES (?, ?, ?, ?)",
+                (bucket, prefix, mode, time.time()),
+            )
+
+            self._refreshed.add((bucket, prefix, mode))
+            changed = bool(removed or upserts)
+            self.stats["changed" if changed else "unchanged"] += 1
+        return changed
+
+    def invalidate(self, bucket: str, key: str) -> None:
+        """Marks every stored prefix that covers `key` as stale."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE listings SET listed_at = 0 "
+                "WHERE bucket = ? AND substr(?, 1, length(prefix)) = prefix",
+                (bucket, key),
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,247 @@
+import bisect
+import json
+import os
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+from .storage_connection import StorageProvider
+
+# Upper bounds, in seconds, of the latency histogram buckets (Prometheus style, plus +Inf)
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class _Series:
+    """Count, total, byte/item totals and latency histogram of one stage or storage method."""
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.bytes = 0
+        self.items = 0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def observe(self, seconds: float, nbytes: int, items: int, error: bool) -> None:
+        self.count += 1
+        self.errors += error
+        self.seconds += seconds
+        self.bytes += nbytes
+        self.items += items
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "seconds": round(self.seconds, 6),
+            "bytes": self.bytes,
+            "items": self.items,
+            "histogram": {
+                str(bound): count
+                for bound, count in zip((*LATENCY_BUCKETS, "+Inf"), self.buckets)
+            },
+        }
+
+
+class Metrics:
+    """
+    Thread-safe timings of a run: pipeline stages (`span`) and storage calls
+    (recorded by `InstrumentedProvider`), written as a JSON summary and/or a
+    Prometheus textfile for the node exporter's textfile collector.
+    """
+
+    def __init__(self, command: str):
+        self.command = command
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self.stages: dict[str, _Series] = {}
+        self.storage: dict[str, _Series] = {}
+
+    def observe(
+        self,
+        kind: str,
+        name: str,
+        seconds: float,
+        nbytes: int = 0,
+        items: int = 0,
+        error: bool = False,
+    ) -> None:
+        series = self.stages if kind == "stage" else self.storage
+        with self._lock:
+            series.setdefault(name, _Series()).observe(seconds, nbytes, items, error)
+
+    @contextmanager
+    def span(self, stage: str) -> Iterator[None]:
+        """Times the block as one occurrence of `stage`; spans may nest and run concurrently."""
+        start = time.perf_counter()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.observe("stage", stage, time.perf_counter() - start, error=error)
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                "command": self.command,
+                "started": self.started,
+                "wall_seconds": round(time.time() - self.started, 6),
+                "stages": {name: s.to_dict() for name, s in sorted(self.stages.items())},
+                "storage": {name: s.to_dict() for name, s in sorted(self.storage.items())},
+            }
+
+    def write_json(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, indent=4)
+
+    def write_prometheus(self, path: str) -> None:
+        """Writes the textfile atomically, so the collector never reads half of it."""
+        summary = self.summary()
+        command = summary["command"]
+        lines = [
+            "# HELP digitization_run_seconds Wall time of the last run.",
+            "# TYPE digitization_run_seconds gauge",
+            f'digitization_run_seconds{{command="{command}"}} {summary["wall_seconds"]}',
+            "# HELP digitization_run_timestamp_seconds Start time of the last run.",
+            "# TYPE digitization_run_timestamp_seconds gauge",
+            f'digitization_run_timestamp_seconds{{command="{command}"}} {summary["started"]}',
+        ]
+        for kind, label in (("stages", "stage"), ("storage", "method")):
+            metric = f"digitization_{'stage' if kind == 'stages' else 'storage_call'}"
+            lines += [
+                f"# HELP {metric}_seconds Latency of each {label}.",
+                f"# TYPE {metric}_seconds histogram",
+            ]
+            for name, series in summary[kind].items():
+                labels = f'command="{command}",{label}="{name}"'
+                cumulative = 0
+                for bound, count in series["histogram"].items():
+                    cumulative += count
+                    lines.append(f'{metric}_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f"{metric}_seconds_sum{{{labels}}} {series['seconds']}")
+                lines.append(f"{metric}_seconds_count{{{labels}}} {series['count']}")
+            for field in ("errors", "bytes", "items"):
+                lines += [
+                    f"# HELP {metric}_{field}_total Total {field} of each {label}.",
+                    f"# TYPE {metric}_{field}_total counter",
+                ]
+                lines += [
+                    f'{metric}_{field}_total{{command="{command}",{label}="{name}"}} {series[field]}'
+                    for name, series in summary[kind].items()
+                ]
+
+        partial_path = f"{path}.{os.getpid()}.tmp"
+        with open(partial_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(partial_path, path)
+
+
+def _size(result) -> int:
+    return len(result) if isinstance(result, (bytes, bytearray)) else 0
+
+
+def _count(result) -> int:
+    return len(result) if isinstance(result, list) else 0
+
+
+class InstrumentedProvider(StorageProvider):
+    """
+    Wraps any `StorageProvider`, recording calls, errors, bytes or items and
+    latency per method in `metrics`. Methods outside the interface are passed
+    through untimed.
+    """
+
+    def __init__(self, provider: StorageProvider, metrics: Metrics):
+        self.provider = provider
+        self.metrics = metrics
+
+    def __getattr__(self, name):
+        # Only reached for attributes the wrapper lacks, e.g. S3Provider.list_objects
+        if name in ("provider", "metrics"):
+            raise AttributeError(name)
+        return getattr(self.provider, name)
+
+    def _call(self, method: str, *args, nbytes=_size, items=_count):
+        start = time.perf_counter()
+        try:
+            result = getattr(self.provider, method)(*args)
+        except BaseException:
+            self.metrics.observe("storage", method, time.perf_counter() - start, error=True)
+            raise
+        self.metrics.observe(
+            "storage",
+            method,
+            time.perf_counter() - start,
+            nbytes=nbytes(result),
+            items=items(result),
+        )
+        return result
+
+    def list_folders(self, base_path: str) -> list[str]:
+        return self._call("list_folders", base_path)
+
+    def list_files(self, folder_path: str, extension: str = None) -> list[str]:
+        return self._call("list_files", folder_path, extension)
+
+    def list_file_entries(self, folder_path: str, extension: str = None) -> list[dict]:
+        return self._call("list_file_entries", folder_path, extension)
+
+    # The *_many listings go through the timed single listings above, on the shared pool
+    def list_folders_many(
+        self, base_paths: list[str], max_workers: int = 8
+    ) -> Iterator[tuple[str, list[str]]]:
+        yield from self._list_many(self.list_folders, base_paths, max_workers)
+
+    def list_files_many(
+        self, folder_paths: list[str], extension: str = None, max_workers: int = 8
+    ) -> Iterator[tuple[str, list[str]]]:
+        yield from self._list_many(
+            lambda path: self.list_files(path, extension), folder_paths, max_workers
+        )
+
+    def list_file_entries_many(
+        self, folder_paths: list[str], extension: str = None, max_workers: int = 8
+    ) -> Iterator[tuple[str, list[dict]]]:
+        yield from self._list_many(
+            lambda path: self.list_file_entries(path, extension),
+            folder_paths,
+            max_workers,
+        )
+
+    def download_to_temp(self, file_path: str, temp_file_path: str) -> None:
+        self._call(
+            "download_to_temp",
+            file_path,
+            temp_file_path,
+            nbytes=lambda _: os.path.getsize(temp_file_path),
+        )
+
+    def download_to_buffer(self, file_path: str, max_size: int) -> bytes | None:
+        return self._call("download_to_buffer", file_path, max_size)
+
+    def read_range(self, file_path: str, start: int, end: int = None) -> bytes:
+        return self._call("read_range", file_path, start, end)
+
+    def local_path(self, file_path: str) -> str | None:
+        return self.provider.local_path(file_path)
+
+    def upload_file(self, local_file_path: str, remote_file_path: str) -> None:
+        self._call(
+            "upload_file",
+            local_file_path,
+            remote_file_path,
+            nbytes=lambda _: os.path.getsize(local_file_path),
+        )
+
+    def generate_presigned_url(self, file_key: str, *args) -> str:
+        return self._call("generate_presigned_url", file_key, *args)
+
+    def generate_presigned_urls(
+        self, file_keys: list[str], file_type: str, content_type: str = None
+    ) -> list[str]:
+        return self._call("generate_presigned_urls", file_keys, file_type, content_type)
@@ -0,0 +1,139 @@
+import base64
+import hashlib
+import hmac
+import time
+from collections.abc import Iterable
+from urllib.parse import quote, urlsplit
+
+
+def _encode(value: str) -> str:
+    """Percent-encodes a query value the way botocore does."""
+    return quote(str(value), safe="-_.~")
+
+
+class BulkPresigner:
+    """
+    Presigns many GET URLs for one bucket without going through boto3 per key.
+
+    The signing scheme, addressing style and credentials are taken from an
+    existing boto3 client, so every URL is identical to the one
+    `client.generate_presigned_url` would return at the same instant. Query
+    SigV2 (what boto3 uses for s3.cern.ch unless a signature version is
+    configured) signs with one pre-keyed HMAC; SigV4 derives the signing key
+    once per date, region and service.
+    """
+
+    PROBE_KEY = "presign-probe"
+
+    def __init__(self, client, bucket: str, credentials):
+        self.bucket = bucket
+        self.credentials = credentials.get_frozen_credentials()
+        self.region = client.meta.region_name or "us-east-1"
+        self.service = "s3"
+
+        probe_url = client.generate_presigned_url(
+            ClientMethod="get_object",
+            Params={"Bucket": bucket, "Key": self.PROBE_KEY},
+            ExpiresIn=60,
+        )
+        base_url, _, query = probe_url.partition("?")
+        self.base_url = base_url[: -len(self.PROBE_KEY)]
+        self.host = urlsplit(probe_url).netloc
+        self.base_path = urlsplit(self.base_url).path
+        self.sigv4 = "X-Amz-Signature=" in query
+
+        self._sigv2_mac = hmac.new(
+            self.credentials.secret_key.encode("utf-8"), digestmod=hashlib.sha1
+        )
+        self._signing_keys: dict[tuple[str, str, str], bytes] = {}
+
+    def _signing_key(self, datestamp: str) -> bytes:
+        cache_key = (datestamp, self.region, self.service)
+        key = self._signing_keys.get(cache_key)
+        if key is None:
+            key = ("AWS4" + self.credentials.secret_key).encode("utf-8")
+            for part in (datestamp, self.region, self.service, "aws4_request"):
+                key = hmac.new(key, part.encode("utf-8"), hashlib.sha256).digest()
+            self._signing_keys[cache_key] = key
+        return key
+
+    def presign(
+        self,
+        file_keys: Iterable[str],
+        expiration: int,
+        content_type: str = None,
+        now: float = None,
+    ) -> list[str]:
+        """Returns one presigned GET URL per key, in input order."""
+        now = time.time() if now is None else now
+        if self.sigv4:
+            return self._presign_sigv4(file_keys, expiration, content_type, now)
+        return self._presign_sigv2(file_keys, expiration, content_type, now)
+
+    def _presign_sigv2(self, file_keys, expiration, content_type, now) -> list[str]:
+        expires = str(int(now + int(expiration)))
+        token = self.credentials.token
+
+        string_to_sign_prefix = f"GET\n\n\n{expires}\n"
+        if token:
+            string_to_sign_prefix += f"x-amz-security-token:{token}\n"
+        string_to_sign_prefix += f"/{self.bucket}/"
+
+        resource_suffix, query_prefix = "", ""
+        if content_type:
+            resource_suffix = f"?response-content-type={content_type}"
+            query_prefix = f"response-content-type={_encode(content_type)}&"
+
+        auth_prefix = f"?{query_prefix}AWSAccessKeyId={_encode(self.credentials.access_key)}&Signature="
+        auth_suffix = f"&x-amz-security-token={_encode(token)}" if token else ""
+        auth_suffix += f"&Expires={expires}"
+
+        mac, base_url, urls = self._sigv2_mac, self.base_url, []
+        for file_key in file_keys:
+            path = quote(file_key, safe="/~")
+            signer = mac.copy()
+            signer.update(f"{string_to_sign_prefix}{path}{resource_suffix}".encode("utf-8"))
+            signature = base64.b64encode(signer.digest()).decode("ascii")
+            urls.append(f"{base_url}{path}{auth_prefix}{_encode(signature)}{auth_suffix}")
+        return urls
+
+    def _presign_sigv4(self, file_keys, expiration, content_type, now) -> list[str]:
+        timestamp = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime(now))
+        datestamp = timestamp[:8]
+        scope = f"{datestamp}/{self.region}/{self.service}/aws4_request"
+        signing_mac = hmac.new(self._signing_key(datestamp), digestmod=hashlib.sha256)
+
+        operation_params = {}
+        if content_type:
+            operation_params["response-content-type"] = content_type
+        auth_params = {
+            "X-Amz-Algorithm": "AWS4-HMAC-SHA256",
+            "X-Amz-Credential": f"{self.credentials.access_key}/{scope}",
+            "X-Amz-Date": timestamp,
+            "X-Amz-Expires": int(expiration),
+            "X-Amz-SignedHeaders": "host",
+        }
+        if self.credentials.token:
+            auth_params["X-Amz-Security-Token"] = self.credentials.token
+
+        def encode_params(params):
+            return "&".join(f"{_encode(k)}={_encode(v)}" for k, v in params.items())
+
+        query = encode_params(operation_params)
+        query = f"{query}&{encode_params(auth_params)}" if query else encode_params(auth_params)
+        canonical_query = "&".join(
+            sorted(f"{_encode(k)}={_encode(v)}" for k, v in {**operation_params, **auth_params}.items())
+        )
+        canonical_suffix = f"\n{canonical_query}\nhost:{self.host}\n\nhost\nUNSIGNED-PAYLOAD"
+        string_to_sign_prefix = f"AWS4-HMAC-SHA256\n{timestamp}\n{scope}\n"
+
+        base_url, base_path, urls = self.base_url, self.base_path, []
+        for file_key in file_keys:
+            path = quote(file_key, safe="/~")
+            canonical_request = f"GET\n{base_path}{path}{canonical_suffix}"
+            signer = signing_mac.copy()
+            signer.update(
+                (string_to_sign_prefix + hashlib.sha256(canonical_request.encode("utf-8")).hexdigest()).encode("utf-8")
+            )
+            urls.append(f"{base_url}{path}?{query}&X-Amz-Signature={signer.hexdigest()}")
+        return urls
@@ -1,8 +1,36 @@
 import boto3
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from botocore.config import Config
+from botocore.credentials import RefreshableCredentials
+from botocore.exceptions import ClientError
 import xml.etree.ElementTree as ET
 from abc import ABC, abstractmethod
+from collections.abc import Iterator
+from contextlib import nullcontext
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from email.utils import parsedate_to_datetime
+from urllib.parse import unquote, urlsplit
 import os
+import shutil
+from datetime import datetime, timezone
+from pathlib import Path
+
+from .concurrency import AIMDLimiter, is_throttle_response
+from .listing_cache import S3ListingCache
+from .presign import BulkPresigner
+
+
+# Linux ioctl cloning a whole file into another one (a reflink)
+FICLONE = 0x40049409
+
+
+def http_range(start: int, end: int = None) -> str:
+    """Builds an HTTP Range header value; a negative start asks for a suffix."""
+    if start < 0:
+        return f"bytes={start}"
+    return f"bytes={start}-{'' if end is None else end}"
 
 
 class StorageProvider(ABC):
@@ -16,10 +44,67 @@ class StorageProvider(ABC):
     def list_files(self, folder_path: str, extension: str = None) -> list[str]:
         pass
 
+    def list_file_entries(self, folder_path: str, extension: str = None) -> list[dict]:
+        """
+        Like `list_files`, as dicts with a "key" and, where the provider knows them,
+        "size" and "etag". Keys only unless overridden.
+        """
+        return [{"key": key} for key in self.list_files(folder_path, extension)]
+
+    def list_file_entries_many(
+        self, folder_paths: list[str], extension: str = None, max_workers: int = 8
+    ) -> Iterator[tuple[str, list[dict]]]:
+        """Yields (folder_path, entries) for each folder path. Serial unless overridden."""
+        for folder_path in folder_paths:
+            yield folder_path, self.list_file_entries(folder_path, extension)
+
+    def list_folders_many(
+        self, base_paths: list[str], max_workers: int = 8
+    ) -> Iterator[tuple[str, list[str]]]:
+        """Yields (base_path, folders) for each base path. Serial unless overridden."""
+        for base_path in base_paths:
+            yield base_path, self.list_folders(base_path)
+
+    def list_files_many(
+        self, folder_paths: list[str], extension: str = None, max_workers: int = 8
+    ) -> Iterator[tuple[str, list[str]]]:
+        """Yields (folder_path, files) for each folder path. Serial unless overridden."""
+        for folder_path in folder_paths:
+            yield folder_path, self.list_files(folder_path, extension)
+
+    def _list_many(self, list_fn, paths: list[str], max_workers: int):
+        """Runs `list_fn` for every path on a bounded pool, yielding results as each completes."""
+        paths = list(dict.fromkeys(paths))
+        if not paths:
+            return
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(paths))) as executor:
+            futures = {executor.submit(list_fn, path): path for path in paths}
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+
     @abstractmethod
     def download_to_temp(self, file_path: str, temp_file_path: str) -> None:
         pass
 
+    def download_to_buffer(self, file_path: str, max_size: int) -> bytes | None:
+        """
+        Downloads a remote file into memory. Returns None when it is larger than
+        `max_size` bytes (or the provider cannot buffer), so the caller can fall
+        back to `download_to_temp`.
+        """
+        return None
+
+    def read_range(self, file_path: str, start: int, end: int = None) -> bytes:
+        """
+        Reads bytes `start`..`end` (inclusive) of a remote file without downloading it.
+        A negative `start` with no `end` reads the last `-start` bytes.
+        """
+        raise NotImplementedError("This method is not available for this storage type.")
+
+    def local_path(self, file_path: str) -> str | None:
+        """Path of the file on local disk when it can be read in place, so it needs no download."""
+        return None
+
     @abstractmethod
     def upload_file(self, local_file_path: str, remote_file_path: str) -> None:
         pass
@@ -30,6 +115,15 @@ class StorageProvider(ABC):
     ) -> str:
         pass
 
+    def generate_presigned_urls(
+        self, file_keys: list[str], file_type: str, content_type: str = None
+    ) -> list[str]:
+        """Presigns many keys at once, in input order. One call per key unless overridden."""
+        return [
+            self.generate_presigned_url(key, file_type, content_type)
+            for key in file_keys
+        ]
+
 
 class S3Provider(StorageProvider):
     def __init__(
@@ -37,23 +131,43 @@ class S3Provider(StorageProvider):
         bucket: str,
         endpoint_url: str = "https://s3.cern.ch",
         custom_expiration: dict = None,
+        listing_cache: S3ListingCache = None,
+        max_pool_connections: int = 10,
+        retry_mode: str = "adaptive",
+        max_attempts: int = 10,
+        limiter: AIMDLimiter = None,
     ):
+        """
+        `max_pool_connections` should cover the number of threads using the
+        provider at once. Throttled or failed requests are retried by botocore
+        with `retry_mode` ("adaptive" also rate-limits the client after
+        throttling) up to `max_attempts` times. With a `limiter`, every request
+        holds one of its slots and every throttled attempt is reported to it.
+        """
         self.bucket = bucket
+        self.listing_cache = listing_cache
+        self.limiter = limiter
 
         if os.environ["ACCESS_KEY"] and os.environ["SECRET_KEY"]:
                 print("Logging into s3 using credentials provided in enviroment variables")
-                self.s3 = boto3.client(
-                    "s3",
+                self.session = boto3.session.Session(
                     aws_access_key_id=os.environ["ACCESS_KEY"],
                     aws_secret_access_key=os.environ["SECRET_KEY"],
-                    endpoint_url=endpoint_url,
                 )
         else:
                 print("Using default s3 login without credentials")
-                self.s3 = boto3.client(
-                    "s3",
-                    endpoint_url=endpoint_url,
-                )
+                self.session = boto3.session.Session()
+        self.s3 = self.session.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            config=Config(
+                max_pool_connections=max_pool_connections,
+                retries={"mode": retry_mode, "total_max_attempts": max_attempts},
+            ),
+        )
+        if limiter is not None:
+            self.s3.meta.events.register("needs-retry.s3", self._report_throttle)
+        self._presigner = None
         self.expiration_config = {
             "PDF": 365,
             "PDF_LATEX": 90,
@@ -64,39 +178,171 @@ class S3Provider(StorageProvider):
         if custom_expiration:
             self.expiration_config.update(custom_expiration)
 
-    def list_folders(self, base_path: str) -> list[str]:
+    def _report_throttle(self, response=None, **kwargs) -> None:
+        # Only observes each attempt; botocore's retry handler still decides on the retry
+        if response is None:
+            return
+        http_response, parsed = response
+        error_code = parsed.get("Error", {}).get("Code")
+        if is_throttle_response(http_response.status_code, error_code):
+            self.limiter.on_throttle()
+
+    def _slot(self):
+        return self.limiter.slot() if self.limiter is not None else nullcontext()
+
+    def _cached_listing(self, prefix: str, mode: str, list_fn) -> list[dict]:
+        """Serves a listing from the local cache when fresh, otherwise lists and stores it."""
+        if self.listing_cache is None:
+            return list_fn()
+
+        entries = self.listing_cache.get(self.bucket, prefix, mode)
+        if entries is None:
+            entries = list_fn()
+            self.listing_cache.put(self.bucket, prefix, mode, entries)
+        return entries
+
+    def _list_folder_entries(self, base_path: str) -> list[dict]:
         paginator = self.s3.get_paginator("list_objects_v2")
         folders = []
-        for page in paginator.paginate(
-            Bucket=self.bucket, Prefix=base_path, Delimiter="/"
-        ):
-            for prefix in page.get("CommonPrefixes", []):
-                folders.append(prefix["Prefix"])
+        with self._slot():
+            for page in paginator.paginate(
+                Bucket=self.bucket, Prefix=base_path, Delimiter="/"
+            ):
+                for prefix in page.get("CommonPrefixes", []):
+                    folders.append({"key": prefix["Prefix"]})
         return folders
 
-    def list_files(self, folder_path: str, extension: str = None) -> list[str]:
+    def _list_object_entries(self, prefix: str) -> list[dict]:
         paginator = self.s3.get_paginator("list_objects_v2")
-        files = []
-        for page in paginator.paginate(Bucket=self.bucket, Prefix=folder_path):
-            for obj in page.get("Contents", []):
-                key = obj["Key"]
-                if not key.endswith("/"):
-                    if extension is None or key.lower().endswith(extension.lower()):
-                        files.append(key)
-        return files
+        objects = []
+        with self._slot():
+            for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+                for obj in page.get("Contents", []):
+                    objects.append(
+                        {
+                            "key": obj["Key"],
+                            "size": obj.get("Size"),
+                            "etag": obj.get("ETag", "").strip('"') or None,
+                            "last_modified": obj["LastModified"].isoformat()
+                            if obj.get("LastModified")
+                            else None,
+                        }
+                    )
+        return objects
+
+    def list_objects(self, prefix: str) -> list[dict]:
+        """Lists every object under `prefix` with its key, size, ETag and LastModified."""
+        return self._cached_listing(
+            prefix, "files", lambda: self._list_object_entries(prefix)
+        )
+
+    def list_folders(self, base_path: str) -> list[str]:
+        entries = self._cached_listing(
+            base_path, "folders", lambda: self._list_folder_entries(base_path)
+        )
+        return [entry["key"] for entry in entries]
+
+    def list_file_entries(self, folder_path: str, extension: str = None) -> list[dict]:
+        entries = []
+        for obj in self.list_objects(folder_path):
+            key = obj["key"]
+            if not key.endswith("/"):
+                if extension is None or key.lower().endswith(extension.lower()):
+                    entries.append(obj)
+        return entries
+
+    def list_files(self, folder_path: str, extension: str = None) -> list[str]:
+        return [entry["key"] for entry in self.list_file_entries(folder_path, extension)]
+
+    def list_folders_many(
+        self, base_paths: list[str], max_workers: int = 8
+    ) -> Iterator[tuple[str, list[str]]]:
+        yield from self._list_many(self.list_folders, base_paths, max_workers)
+
+    def list_files_many(
+        self, folder_paths: list[str], extension: str = None, max_workers: int = 8
+    ) -> Iterator[tuple[str, list[str]]]:
+        yield from self._list_many(
+            lambda path: self.list_files(path, extension), folder_paths, max_workers
+        )
+
+    def list_file_entries_many(
+        self, folder_paths: list[str], extension: str = None, max_workers: int = 8
+    ) -> Iterator[tuple[str, list[dict]]]:
+        yield from self._list_many(
+            lambda path: self.list_file_entries(path, extension),
+            folder_paths,
+            max_workers,
+        )
 
     def download_to_temp(self, file_path: str, temp_file_path: str) -> None:
-        self.s3.download_file(self.bucket, file_path, temp_file_path)
+        with self._slot():
+            self.s3.download_file(self.bucket, file_path, temp_file_path)
+
+    def download_to_buffer(self, file_path: str, max_size: int) -> bytes | None:
+        with self._slot():
+            response = self.s3.get_object(Bucket=self.bucket, Key=file_path)
+            body = response["Body"]
+            if response["ContentLength"] > max_size:
+                body.close()
+                return None
+            with body:
+                return body.read()
+
+    def read_range(self, file_path: str, start: int, end: int = None) -> bytes:
+        with self._slot():
+            try:
+                response = self.s3.get_object(
+                    Bucket=self.bucket, Key=file_path, Range=http_range(start, end)
+                )
+            except ClientError as e:
+                # Empty objects cannot satisfy any range
+                if e.response.get("Error", {}).get("Code") == "InvalidRange":
+                    return b""
+                raise
+            return response["Body"].read()
 
     def upload_file(self, local_file_path: str, remote_file_path: str) -> None:
-        self.s3.upload_file(local_file_path, self.bucket, remote_file_path)
+        with self._slot():
+            self.s3.upload_file(local_file_path, self.bucket, remote_file_path)
+        if self.listing_cache is not None:
+            self.listing_cache.invalidate(self.bucket, remote_file_path)
+
+    def _expiration_for(self, file_type: str) -> int:
+        return 86400 * (
+            self.expiration_config.get(file_type, self.expiration_config["DEFAULT"])
+        )
+
+    def generate_presigned_urls(
+        self, file_keys: list[str], file_type: str, content_type: str = None
+    ) -> list[str]:
+        """
+        Presigns all keys in one pass, producing the same URLs as generate_presigned_url.
+        Without credentials, or with refreshable ones that the bulk signer cannot
+        track, every key goes through boto3 instead.
+        """
+        if not file_keys:
+            return []
+        credentials = self.session.get_credentials()
+        if credentials is None or isinstance(credentials, RefreshableCredentials):
+            return [
+                self.generate_presigned_url(key, file_type, content_type)
+                for key in file_keys
+            ]
+        # Re-read for each batch, so the signer never outlives the credentials it was built with
+        if (
+            self._presigner is None
+            or self._presigner.credentials != credentials.get_frozen_credentials()
+        ):
+            self._presigner = BulkPresigner(self.s3, self.bucket, credentials)
+        return self._presigner.presign(
+            file_keys, self._expiration_for(file_type), content_type
+        )
 
     def generate_presigned_url(
         self, file_key: str, file_type: str, content_type: str = None
     ) -> str:
-        expiration = 86400 * (
-            self.expiration_config.get(file_type, self.expiration_config["DEFAULT"])
-        )
+        expiration = self._expiration_for(file_type)
 
         params = {"Bucket": self.bucket, "Key": file_key}
         if content_type:
@@ -110,7 +356,24 @@ class S3Provider(StorageProvider):
 
 
 class CernboxProvider(StorageProvider):
-    def __init__(self, public_link_hash: str = None):
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+    RETRY_METHODS = frozenset({"GET", "HEAD", "PROPFIND", "PUT"})
+    # Servers that forbid `Depth: infinity` (e.g. `propfind-finite-depth`) answer with one of these
+    DEPTH_INFINITY_REFUSED = (400, 403, 501)
+    PROPFIND_BODY = (
+        '<?xml version="1.0"?>'
+        '<d:propfind xmlns:d="DAV:"><d:prop>'
+        "<d:resourcetype/><d:getcontentlength/><d:getetag/><d:getlastmodified/>"
+        "</d:prop></d:propfind>"
+    )
+
+    def __init__(
+        self,
+        public_link_hash: str = None,
+        pool_size: int = 16,
+        retries: int = 5,
+        backoff_factor: float = 0.5,
+    ):
         self.account = os.getenv("CERNBOX_ACCOUNT")
         self.password = os.getenv("CERNBOX_PASSWORD")
 
@@ -130,43 +393,204 @@ class CernboxProvider(StorageProvider):
             )
             self.auth = (self.account, self.password)
 
-    def _propfind(self, path: str, depth: str = "1") -> list[str]:
-
-        url = f"{self.base_url}/{path}/" if path else f"{self.base_url}/"
-        headers = {"Depth": depth}
-
-        response = requests.request("PROPFIND", url, headers=headers, auth=self.auth)
-        response.raise_for_status()
-
-        root = ET.fromstring(response.content)
-        namespaces = {"d": "DAV:"}
-
-        paths = []
-        for response_tag in root.findall("d:response", namespaces)[1:]:
-            href = response_tag.find("d:href", namespaces).text
-            filename = href.rstrip("/").split("/")[-1]
-
-            paths.append(filename)
+        # One pooled, retrying session: connections are reused across calls and threads
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=self.RETRY_STATUSES,
+            allowed_methods=self.RETRY_METHODS,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+        )
+        self.session = requests.Session()
+        self.session.auth = self.auth
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.depth_infinity = True
+
+    def _propfind_response(self, path: str, depth: str):
+        url = f"{self.base_url}/{path.strip('/')}/" if path.strip("/") else f"{self.base_url}/"
+        headers = {"Depth": depth, "Content-Type": "application/xml"}
+        return self.session.request(
+            "PROPFIND", url, headers=headers, data=self.PROPFIND_BODY, stream=True
+        )
 
-        return paths
+    def _parse_multistatus(self, response) -> Iterator[dict]:
+        """
+        Incrementally parses a PROPFIND multistatus body, yielding one entry per
+        <d:response> as it arrives: key (relative to the share), is_dir, size,
+        etag and last_modified.
+        """
+        base_path = unquote(urlsplit(self.base_url).path).rstrip("/")
+        response.raw.decode_content = True
+        root = None
+        for event, elem in ET.iterparse(response.raw, events=("start", "end")):
+            if root is None:
+                root = elem
+            if event != "end" or elem.tag != "{DAV:}response":
+                continue
+
+            href = unquote(urlsplit(elem.findtext("{DAV:}href", "")).path)
+            prop = elem.find("{DAV:}propstat/{DAV:}prop")
+            is_dir = prop is not None and prop.find("{DAV:}resourcetype/{DAV:}collection") is not None
+            size = prop.findtext("{DAV:}getcontentlength") if prop is not None else None
+            etag = prop.findtext("{DAV:}getetag") if prop is not None else None
+            modified = prop.findtext("{DAV:}getlastmodified") if prop is not None else None
+
+            yield {
+                "key": href[len(base_path):].strip("/") if href.startswith(base_path) else href.strip("/"),
+                "is_dir": is_dir or href.endswith("/"),
+                "size": int(size) if size else None,
+                "etag": etag.strip('"') if etag else None,
+                "last_modified": parsedate_to_datetime(modified).isoformat() if modified else None,
+            }
+            # Processed responses are dropped so memory stays flat on large trees
+            root.clear()
+
+    def _propfind_entries(self, path: str, depth: str = "1") -> Iterator[dict]:
+        """Yields the entries below `path` (the folder itself excluded)."""
+        with self._propfind_response(path, depth) as response:
+            response.raise_for_status()
+            for entry in self._parse_multistatus(response):
+                if entry["key"] != path.strip("/"):
+                    yield entry
+
+    def walk(self, path: str = "", max_workers: int = 8) -> Iterator[dict]:
+        """
+        Yields every file and folder below `path`, recursively, as responses arrive.
+        Uses a single `Depth: infinity` PROPFIND where the server allows it, otherwise
+        lists subfolders concurrently with `Depth: 1`.
+        """
+        if self.depth_infinity:
+            with self._propfind_response(path, "infinity") as response:
+                if response.status_code not in self.DEPTH_INFINITY_REFUSED:
+                    response.raise_for_status()
+                    for entry in self._parse_multistatus(response):
+                        if entry["key"] != path.strip("/"):
+                            yield entry
+                    return
+            self.depth_infinity = False
+
+        def list_level(folder):
+            return list(self._propfind_entries(folder))
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = {executor.submit(list_level, path)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    for entry in future.result():
+                        if entry["is_dir"]:
+                            pending.add(executor.submit(list_level, entry["key"]))
+                        yield entry
 
     def list_folders(self, base_path: str) -> list[str]:
-        raise NotImplementedError("This method is not available for this storage type.")
+        return [
+            f"{entry['key']}/" for entry in self._propfind_entries(base_path) if entry["is_dir"]
+        ]
 
     def list_files(self, folder_path: str, extension: str = None) -> list[str]:
-        all_items = self._propfind(folder_path)
-        if extension:
-            return [p for p in all_items if p.lower().endswith(extension.lower())]
-        return all_items
+        """Paths in the share of every file below `folder_path`, recursively, like S3 keys under a prefix."""
+        return [entry["key"] for entry in self.list_file_entries(folder_path, extension)]
+
+    def list_folder_files(self, folder_path: str, extension: str = None) -> list[str]:
+        """Paths in the share of the files directly in `folder_path`, from a single `Depth: 1` PROPFIND."""
+        return [
+            entry["key"]
+            for entry in self._propfind_entries(folder_path)
+            if not entry["is_dir"]
+            and (extension is None or entry["key"].lower().endswith(extension.lower()))
+        ]
+
+    def list_file_entries(self, folder_path: str, extension: str = None) -> list[dict]:
+        """Every file below `folder_path`, recursively, keyed by its path in the share (like an S3 prefix)."""
+        return [
+            entry
+            for entry in self.walk(folder_path)
+            if not entry["is_dir"]
+            and (extension is None or entry["key"].lower().endswith(extension.lower()))
+        ]
+
+    def list_file_entries_many(
+        self, folder_paths: list[str], extension: str = None, max_workers: int = 8
+    ) -> Iterator[tuple[str, list[dict]]]:
+        yield from self._list_many(
+            lambda path: self.list_file_entries(path, extension),
+            folder_paths,
+            max_workers,
+        )
 
     def download_to_temp(self, file_path: str, temp_file_path: str) -> None:
         url = f"{self.base_url}/{file_path}"
-        response = requests.get(url, stream=True, auth=self.auth)
-        response.raise_for_status()
-
-        with open(temp_file_path, "wb") as f:
+        with self.session.get(url, stream=True) as response:
+            response.raise_for_status()
+
+            with open(temp_file_path, "wb") as f:
+                for chunk in response.iter_content(chunk_size=65536):
+                    f.write(chunk)
+
+    def download_if_changed(
+        self, file_path: str, local_file_path: str, etag: str = None
+    ) -> tuple[bool, str | None]:
+        """
+        Downloads `file_path` unless the server answers 304 to `If-None-Match: etag`.
+        Returns (downloaded, current ETag). The local file is replaced atomically.
+        """
+        url = f"{self.base_url}/{file_path}"
+        headers = {}
+        if etag and os.path.exists(local_file_path):
+            headers["If-None-Match"] = etag
+
+        with self.session.get(url, headers=headers, stream=True) as response:
+            if response.status_code == 304:
+                return False, etag
+            response.raise_for_status()
+
+            partial_path = f"{local_file_path}.part"
+            with open(partial_path, "wb") as f:
+                for chunk in response.iter_content(chunk_size=65536):
+                    f.write(chunk)
+            os.replace(partial_path, local_file_path)
+            return True, response.headers.get("ETag")
+
+    def download_to_buffer(self, file_path: str, max_size: int) -> bytes | None:
+        url = f"{self.base_url}/{file_path}"
+        with self.session.get(url, stream=True) as response:
+            response.raise_for_status()
+            if int(response.headers.get("Content-Length", 0)) > max_size:
+                return None
+
+            chunks, size = [], 0
+            for chunk in response.iter_content(chunk_size=65536):
+                size += len(chunk)
+                # No (or a wrong) Content-Length: stop as soon as the limit is passed
+                if size > max_size:
+                    return None
+                chunks.append(chunk)
+        return b"".join(chunks)
+
+    def read_range(self, file_path: str, start: int, end: int = None) -> bytes:
+        url = f"{self.base_url}/{file_path}"
+        headers = {"Range": http_range(start, end)}
+        with self.session.get(url, headers=headers, stream=True) as response:
+            if response.status_code == 416:
+                return b""
+            response.raise_for_status()
+            if response.status_code == 206:
+                return response.content
+
+            # The server ignored the Range header: cut the slice out of the body
+            if start < 0:
+                return response.content[start:]
+            stop = None if end is None else end + 1
+            data = bytearray()
             for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
+                data += chunk
+                if stop is not None and len(data) >= stop:
+                    break
+            return bytes(data[start:stop])
 
     def upload_file(self, local_file_path: str, remote_file_path: str) -> None:
         if self.is_public:
@@ -176,10 +600,155 @@ class CernboxProvider(StorageProvider):
         url = f"{self.base_url}/{clean_remote_path}"
 
         with open(local_file_path, "rb") as f:
-            response = requests.put(url, data=f, auth=self.auth)
+            response = self.session.put(url, data=f)
         response.raise_for_status()
 
     def generate_presigned_url(
         self, file_key: str, content_type: str = None, expiration: int = None
     ) -> str:
         return f"{self.base_url}/{file_key}"
+
+
+def copy_file(source: str, target: str) -> None:
+    """
+    Copies `source` to `target`. On copy-on-write filesystems (Btrfs, XFS) the
+    copy shares the data blocks until either file is written; unlike a hard
+    link, later writes to `source` never show through `target`.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        fcntl = None
+    if fcntl is not None:
+        with open(source, "rb") as src, open(target, "wb") as dst:
+            try:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+                return
+            except OSError:
+                pass
+    shutil.copyfile(source, target)
+
+
+class LocalProvider(StorageProvider):
+    """
+    A directory tree on local disk (or an EOS FUSE mount) behind the
+    `StorageProvider` interface. Keys are paths relative to `root` and are
+    matched like S3 prefixes, so callers written for `S3Provider` work unchanged.
+    Files are read in place through `local_path` instead of being downloaded.
+    """
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key.lstrip("/"))
+
+    def _scan_prefix(self, prefix: str) -> Iterator[tuple[str, os.DirEntry]]:
+        """Yields (key, entry) for the entries directly matching `prefix`, like a delimited S3 listing."""
+        parent, _, name_prefix = prefix.rpartition("/")
+        parent_key = f"{parent}/" if parent else ""
+        try:
+            entries = list(os.scandir(self._path(parent)))
+        except (FileNotFoundError, NotADirectoryError):
+            return
+        for entry in sorted(entries, key=lambda entry: entry.name):
+            if entry.name.startswith(name_prefix):
+                yield parent_key + entry.name, entry
+
+    @staticmethod
+    def _file_entry(key: str, entry: os.DirEntry) -> dict:
+        stat = entry.stat()
+        return {
+            "key": key,
+            "size": stat.st_size,
+            # Changes whenever the file is rewritten, like an S3 ETag
+            "etag": f"{stat.st_mtime_ns:x}-{stat.st_size:x}",
+            "last_modified": datetime.fromtimestamp(
+                stat.st_mtime, tz=timezone.utc
+            ).isoformat(),
+        }
+
+    def _walk(self, prefix: str) -> Iterator[dict]:
+        pending = [prefix]
+        while pending:
+            current = pending.pop()
+            subdirectories = []
+            for key, entry in self._scan_prefix(current):
+                if entry.is_dir():
+                    subdirectories.append(f"{key}/")
+                elif entry.is_file():
+                    yield self._file_entry(key, entry)
+            pending.extend(reversed(subdirectories))
+
+    def list_folders(self, base_path: str) -> list[str]:
+        return [
+            f"{key}/" for key, entry in self._scan_prefix(base_path) if entry.is_dir()
+        ]
+
+    def list_file_entries(self, folder_path: str, extension: str = None) -> list[dict]:
+        """Every file whose key starts with `folder_path`, recursively."""
+        return [
+            entry
+            for entry in self._walk(folder_path)
+            if extension is None or entry["key"].lower().endswith(extension.lower())
+        ]
+
+    def list_files(self, folder_path: str, extension: str = None) -> list[str]:
+        return [entry["key"] for entry in self.list_file_entries(folder_path, extension)]
+
+    def list_folders_many(
+        self, base_paths: list[str], max_workers: int = 8
+    ) -> Iterator[tuple[str, list[str]]]:
+        yield from self._list_many(self.list_folders, base_paths, max_workers)
+
+    def list_files_many(
+        self, folder_paths: list[str], extension: str = None, max_workers: int = 8
+    ) -> Iterator[tuple[str, list[str]]]:
+        yield from self._list_many(
+            lambda path: self.list_files(path, extension), folder_paths, max_workers
+        )
+
+    def list_file_entries_many(
+        self, folder_paths: list[str], extension: str = None, max_workers: int = 8
+    ) -> Iterator[tuple[str, list[dict]]]:
+        yield from self._list_many(
+            lambda path: self.list_file_entries(path, extension),
+            folder_paths,
+            max_workers,
+        )
+
+    def local_path(self, file_path: str) -> str | None:
+        return self._path(file_path)
+
+    def download_to_temp(self, file_path: str, temp_file_path: str) -> None:
+        # Copied in the kernel (sendfile) rather than through Python buffers
+        shutil.copyfile(self._path(file_path), temp_file_path)
+
+    def download_to_buffer(self, file_path: str, max_size: int) -> bytes | None:
+        with open(self._path(file_path), "rb") as f:
+            if os.fstat(f.fileno()).st_size > max_size:
+                return None
+            return f.read()
+
+    def read_range(self, file_path: str, start: int, end: int = None) -> bytes:
+        with open(self._path(file_path), "rb") as f:
+            if start < 0:
+                f.seek(max(os.fstat(f.fileno()).st_size + start, 0))
+                return f.read()
+            f.seek(start)
+            return f.read() if end is None else f.read(max(end + 1 - start, 0))
+
+    def upload_file(self, local_file_path: str, remote_file_path: str) -> None:
+        """Copies the file into the tree, as a reflink where the filesystem supports it."""
+        target = self._path(remote_file_path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        partial_path = f"{target}.part"
+        if os.path.lexists(partial_path):
+            os.remove(partial_path)
+        copy_file(local_file_path, partial_path)
+        os.replace(partial_path, target)
+
+    def generate_presigned_url(
+        self, file_key: str, file_type: str = None, content_type: str = None
+    ) -> str:
+        return Path(self._path(file_key)).as_uri()